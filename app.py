@@ -4,25 +4,36 @@ Supports both voice and text input with Hume.ai STT and Google ADK AI responses.
 """
 
 import os
+import asyncio
 import logging
 import pathlib
 import hashlib
+import hmac
 import csv
 import io
-from datetime import datetime
-from typing import Optional, List, Dict
-from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Optional, List, Dict, Tuple, Iterator
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+import httpx
+import orjson
 
+from config import Settings
 from integrations.hume_client import HumeClient
-from integrations.llm_client import LLMClient
-from services.conversation_service import ConversationService
+from integrations.llm_client import LLMClient, aclose_shared_client
+from services.conversation_service import ConversationService, format_timestamp
+from services.redis_conversation_service import RedisConversationService
+from services.session_backends import SQLiteBackend
+from services.chat_batcher import ChatBatcher
+from services.response_cache import ResponseCache, load_sentence_transformer_embedder
 
 # Configure logging first (before loading .env so we can log about it)
 logging.basicConfig(
@@ -44,6 +55,68 @@ else:
     logger.warning("   Please create a .env file in the project root with your API keys.")
     logger.warning(f"   Expected location: {pathlib.Path('.').absolute()}/.env")
 
+# Freeze configuration once, after .env has been loaded into the environment
+settings = Settings()
+
+
+def load_html_page(path: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Read an HTML page once so it can be served from memory.
+    
+    Args:
+        path: Path to the HTML file
+        
+    Returns:
+        Tuple of (content bytes, quoted ETag), or None if the file is missing
+    """
+    try:
+        content = pathlib.Path(path).read_bytes()
+    except FileNotFoundError:
+        logger.warning(f"HTML page not found: {path}")
+        return None
+    etag = f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+    return content, etag
+
+
+def serve_html_page(request: Request, page: Optional[Tuple[bytes, str]], not_found_message: str) -> Response:
+    """
+    Serve a cached HTML page, answering 304 when the client already has it.
+    
+    Args:
+        request: Incoming request (checked for If-None-Match)
+        page: Cached (content, ETag) tuple from load_html_page
+        not_found_message: Error shown when the page could not be loaded
+        
+    Returns:
+        HTML response, 304 Not Modified, or 404 error page
+    """
+    if page is None:
+        return HTMLResponse(content=f"<h1>Error: {not_found_message}</h1>", status_code=404)
+    
+    content, etag = page
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    return HTMLResponse(content=content, headers={"ETag": etag})
+
+
+def utc_now_iso() -> str:
+    """Current UTC time as an ISO 8601 string with second precision."""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def set_clock(app: FastAPI):
+    """Update the cached timestamp and the pre-encoded health check body."""
+    app.state.now_iso = utc_now_iso()
+    app.state.health_body = orjson.dumps({"status": "healthy", "timestamp": app.state.now_iso})
+
+
+async def tick_clock(app: FastAPI):
+    """Refresh the cached timestamp once per second so request handlers don't format timestamps."""
+    while True:
+        set_clock(app)
+        await asyncio.sleep(1)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -51,6 +124,21 @@ async def lifespan(app: FastAPI):
     # Initialize clients
     logger.info("Initializing application...")
     
+    # Cached response timestamp, refreshed by a background task
+    set_clock(app)
+    clock_task = asyncio.create_task(tick_clock(app))
+    
+    app.state.settings = settings
+    
+    # Hash the admin key once; requests are checked against the digest in constant time
+    app.state.admin_key_digest = hashlib.sha256(settings.admin_key.encode()).digest() if settings.admin_key else None
+    if app.state.admin_key_digest is None:
+        logger.warning("ADMIN_KEY not set - allowing admin access (NOT SECURE FOR PRODUCTION)")
+    
+    # Pages are immutable for the lifetime of the process, so read them once
+    app.state.index_page = load_html_page("static/index.html")
+    app.state.admin_page = load_html_page("static/admin.html")
+    
     # Helper function to mask API keys for logging
     def mask_api_key(key: Optional[str], show_length: bool = True) -> str:
         """Mask API key for safe logging."""
@@ -63,8 +151,16 @@ async def lifespan(app: FastAPI):
             return f"{masked} (length: {len(key)})"
         return masked
     
+    # One pooled HTTP/2 client shared by all outbound API calls, so TLS
+    # connections to Hume.ai and the LLM provider are kept alive between requests
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(60.0, connect=5.0),
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100)
+    )
+    
     # Validate and log API keys
-    hume_api_key = os.getenv("HUME_API_KEY")
+    hume_api_key = settings.hume_api_key
     logger.info(f"Hume.ai API Key: {mask_api_key(hume_api_key)}")
     
     if not hume_api_key or hume_api_key == "your_hume_api_key_here":
@@ -72,39 +168,41 @@ async def lifespan(app: FastAPI):
     
     app.state.hume_client = HumeClient(
         api_key=hume_api_key or "",
-        api_url=os.getenv("HUME_API_URL", "https://api.hume.ai")
+        api_url=settings.hume_api_url,
+        http_client=app.state.http,
+        max_rps=settings.hume_max_rps
     )
-    logger.info(f"Hume.ai API URL: {os.getenv('HUME_API_URL', 'https://api.hume.ai')}")
+    logger.info(f"Hume.ai API URL: {settings.hume_api_url}")
     
     # Initialize LLM client (supports Gemini, OpenAI-compatible, and Hugging Face)
-    llm_provider = os.getenv("LLM_PROVIDER", "gemini").lower()
-    llm_api_key = os.getenv("LLM_API_KEY", "")
-    llm_api_url = os.getenv("LLM_API_URL")
+    llm_provider = settings.llm_provider.lower()
+    llm_api_key = settings.llm_api_key
+    llm_api_url = settings.llm_api_url
     # Default to gemini-2.5-flash-lite (latest efficient model)
-    llm_model_name = os.getenv("LLM_MODEL_NAME", "gemini-2.5-flash-lite")
-    llm_system_instruction = os.getenv("LLM_SYSTEM_INSTRUCTION")
+    llm_model_name = settings.llm_model_name
+    llm_system_instruction = settings.llm_system_instruction
     
     # Debug: Log what we found in environment
     logger.debug(f"Environment check - LLM_API_KEY: {'SET' if llm_api_key else 'NOT_SET'}")
-    logger.debug(f"Environment check - GOOGLE_ADK_API_KEY: {'SET' if os.getenv('GOOGLE_ADK_API_KEY') else 'NOT_SET'}")
+    logger.debug(f"Environment check - GOOGLE_ADK_API_KEY: {'SET' if settings.google_adk_api_key else 'NOT_SET'}")
     
     # Backward compatibility: use old env vars if new ones not set
     if llm_provider == "gemini" and not llm_api_key:
-        google_adk_key = os.getenv("GOOGLE_ADK_API_KEY", "")
+        google_adk_key = settings.google_adk_api_key
         logger.debug(f"Falling back to GOOGLE_ADK_API_KEY: {'SET' if google_adk_key else 'NOT_SET'}")
         if google_adk_key:
             llm_api_key = google_adk_key
         if not llm_api_url:
-            llm_api_url = os.getenv("GOOGLE_ADK_API_URL", "https://generativelanguage.googleapis.com/v1beta")
+            llm_api_url = settings.google_adk_api_url
         # Use GOOGLE_ADK_MODEL_NAME if set, otherwise keep default
-        google_model = os.getenv("GOOGLE_ADK_MODEL_NAME")
+        google_model = settings.google_adk_model_name
         if google_model:
             llm_model_name = google_model
         elif llm_model_name == "gemini-pro":
             # Default to gemini-2.5-flash-lite as gemini-pro is deprecated
             llm_model_name = "gemini-2.5-flash-lite"
         if not llm_system_instruction:
-            llm_system_instruction = os.getenv("GOOGLE_ADK_SYSTEM_INSTRUCTION")
+            llm_system_instruction = settings.google_adk_system_instruction
     
     # Log LLM configuration
     logger.info(f"LLM Provider: {llm_provider}")
@@ -134,21 +232,66 @@ async def lifespan(app: FastAPI):
     elif llm_provider in ["openai_compatible", "huggingface"] and not llm_api_key:
         logger.info(f"Using {llm_provider} provider without API key (may work for local models)")
     
+    # Cache LLM responses for repeated (or, with an embedding model, paraphrased) messages
+    app.state.response_cache = ResponseCache(
+        max_entries=settings.response_cache_max_entries,
+        embedder=(
+            load_sentence_transformer_embedder(settings.response_cache_embedding_model)
+            if settings.response_cache_embedding_model else None
+        ),
+        similarity_threshold=settings.response_cache_similarity_threshold,
+        ttl_seconds=settings.response_cache_ttl_seconds,
+        max_semantic_entries=settings.response_cache_semantic_max_entries
+    )
+    
     app.state.llm_client = LLMClient(
         provider=llm_provider,
         api_key=llm_api_key or None,
         api_url=llm_api_url,
         model_name=llm_model_name,
-        system_instruction=llm_system_instruction
+        system_instruction=llm_system_instruction,
+        http_client=app.state.http,
+        semantic_cache=app.state.response_cache,
+        max_prompt_tokens=settings.llm_max_prompt_tokens
     )
     
     # Backward compatibility alias
     app.state.google_adk_client = app.state.llm_client
-    app.state.conversation_service = ConversationService()
+    if settings.redis_url:
+        # Shared store so every worker process sees the same sessions
+        app.state.conversation_service = RedisConversationService.from_url(
+            settings.redis_url,
+            local_cache_size=settings.session_cache_size,
+            summary_cache_dir=settings.summary_cache_dir
+        )
+    else:
+        app.state.conversation_service = ConversationService(
+            summary_cache_dir=settings.summary_cache_dir,
+            max_messages_per_session=settings.session_max_messages,
+            max_sessions=settings.max_sessions,
+            backend=SQLiteBackend(settings.session_db_path) if settings.session_db_path else None
+        )
+    
+    # Group concurrent chat requests into a single LLM round
+    app.state.chat_batcher = ChatBatcher(
+        app.state.llm_client,
+        max_batch=settings.chat_batch_max_size,
+        max_wait_ms=settings.chat_batch_max_wait_ms
+    )
+    app.state.chat_batcher.start()
     logger.info("Application initialized successfully")
     yield
     # Cleanup (if needed)
     logger.info("Shutting down application...")
+    await app.state.chat_batcher.stop()
+    clock_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await clock_task
+    await app.state.hume_client.aclose()
+    await app.state.llm_client.aclose()
+    await aclose_shared_client()
+    await app.state.http.aclose()
+    app.state.conversation_service.close()
 
 
 # Create FastAPI app
@@ -156,12 +299,13 @@ app = FastAPI(
     title="Conversational AI Webapp",
     description="Voice and text conversational interface with Hume.ai and Google ADK",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware for frontend communication
 # In production, update allow_origins to only include your domain
-allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
+allowed_origins = settings.allowed_origins.split(",")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins if "*" not in allowed_origins else ["*"],
@@ -186,17 +330,18 @@ class ChatResponse(BaseModel):
     timestamp: str
 
 
+class SynthesizeRequest(BaseModel):
+    text: str = Field(min_length=1, max_length=4000)
+
+
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
+async def read_root(request: Request):
     """Serve the main HTML page."""
-    try:
-        with open("static/index.html", "r") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(
-            content="<h1>Error: Frontend not found. Please ensure static/index.html exists.</h1>",
-            status_code=404
-        )
+    return serve_html_page(
+        request,
+        getattr(app.state, "index_page", None),
+        "Frontend not found. Please ensure static/index.html exists."
+    )
 
 
 @app.post("/api/chat", response_model=ChatResponse)
@@ -213,27 +358,30 @@ async def chat(message: ChatMessage):
     try:
         logger.info(f"Received chat message: {message.message[:50]}...")
         
-        # Get session ID or create new one
-        session_id = message.session_id or app.state.conversation_service.create_session()
+        # Get session ID or create new one. Conversation storage calls are
+        # blocking (Redis round trips, SQLite), so they run in the threadpool
+        service = app.state.conversation_service
+        session_id = message.session_id or await run_in_threadpool(service.create_session)
         
-        # Store user message in conversation service
-        app.state.conversation_service.add_message(session_id, "user", message.message)
+        # Fetch history before storing the new message: the LLM receives the
+        # message separately, so it must not also appear at the end of the history
+        history = await get_prompt_history(session_id)
         
         # Get AI response from LLM (supports Gemini, OpenAI-compatible, Hugging Face)
-        ai_response = await app.state.llm_client.get_response(
-            message=message.message,
-            conversation_history=app.state.conversation_service.get_session_history(session_id)
-        )
+        # (repeated and paraphrased messages are answered from the LLM client's response cache)
+        ai_response = await app.state.chat_batcher.submit(message.message, history)
         
-        # Store AI response in conversation service
-        app.state.conversation_service.add_message(session_id, "assistant", ai_response)
+        # Store the exchange in conversation service
+        await run_in_threadpool(
+            service.add_messages, session_id, [("user", message.message), ("assistant", ai_response)]
+        )
         
         logger.info(f"Generated AI response: {ai_response[:50]}...")
         
         return ChatResponse(
             response=ai_response,
             session_id=session_id,
-            timestamp=datetime.now().isoformat()
+            timestamp=app.state.now_iso
         )
         
     except Exception as e:
@@ -241,6 +389,81 @@ async def chat(message: ChatMessage):
         raise HTTPException(status_code=500, detail=f"Error processing message: {str(e)}")
 
 
+async def get_prompt_history(session_id: str):
+    """Get a session's history compacted to the configured token budget for the LLM."""
+    return await app.state.conversation_service.get_compacted_history(
+        session_id,
+        summarizer=app.state.llm_client.summarize,
+        model_id=app.state.llm_client.model_name,
+        max_tokens=settings.history_max_tokens,
+        keep_recent=settings.history_keep_recent
+    )
+
+
+def sse_event(data: Dict, event: Optional[str] = None) -> bytes:
+    """Format a Server-Sent Events message with a JSON payload."""
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(message: ChatMessage):
+    """
+    Process text message and stream the AI response as Server-Sent Events.
+    
+    Emits `data: {"delta": "..."}` events as text is generated, then a final
+    `data: {"done": true, "response", "session_id", "timestamp"}` event. Errors
+    are reported as an `error` event. The exchange is stored in the
+    conversation once the stream completes.
+    
+    Args:
+        message: ChatMessage containing user text and optional session_id
+        
+    Returns:
+        text/event-stream response
+    """
+    logger.info(f"Received streaming chat message: {message.message[:50]}...")
+    
+    service = app.state.conversation_service
+    session_id = message.session_id or await run_in_threadpool(service.create_session)
+    history = await get_prompt_history(session_id)
+    
+    async def event_stream():
+        try:
+            chunks = []
+            async for chunk in app.state.llm_client.stream_response(
+                message=message.message,
+                conversation_history=history
+            ):
+                chunks.append(chunk)
+                yield sse_event({"delta": chunk})
+            ai_response = "".join(chunks)
+            
+            await run_in_threadpool(
+                service.add_messages, session_id, [("user", message.message), ("assistant", ai_response)]
+            )
+            logger.info(f"Streamed AI response: {ai_response[:50]}...")
+            
+            yield sse_event({
+                "done": True,
+                "response": ai_response,
+                "session_id": session_id,
+                "timestamp": app.state.now_iso
+            })
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {str(e)}", exc_info=True)
+            yield sse_event({"detail": f"Error processing message: {str(e)}"}, event="error")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx) so chunks flush immediately
+        }
+    )
+
+
 @app.post("/api/voice/transcribe")
 async def transcribe_voice(audio: UploadFile = File(...)):
     """
@@ -255,15 +478,20 @@ async def transcribe_voice(audio: UploadFile = File(...)):
     try:
         logger.info(f"Received audio file: {audio.filename}, content_type: {audio.content_type}")
         
-        # Read audio file
-        audio_data = await audio.read()
+        # Hand the spooled upload straight to Hume.ai: UploadFile is already backed by
+        # a SpooledTemporaryFile, so the audio is streamed in chunks rather than
+        # loaded into memory with audio.read()
+        await audio.seek(0)
         
         # Transcribe using Hume.ai
-        transcription = await app.state.hume_client.transcribe_audio(audio_data)
+        transcription = await app.state.hume_client.transcribe_audio(
+            audio.file,
+            content_type=audio.content_type or "audio/wav"
+        )
         
         logger.info(f"Transcription: {transcription}")
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "transcription": transcription,
             "status": "success"
         })
@@ -274,27 +502,24 @@ async def transcribe_voice(audio: UploadFile = File(...)):
 
 
 @app.post("/api/voice/synthesize")
-async def synthesize_voice(request: dict):
+async def synthesize_voice(req: SynthesizeRequest):
     """
     Synthesize text to speech using Hume.ai (optional TTS).
     
     Args:
-        request: Dict with 'text' key containing text to synthesize
+        req: Request body with the text to synthesize (validated before the handler runs)
         
     Returns:
         Audio file or URL to audio
     """
     try:
-        text = request.get("text", "")
-        if not text:
-            raise HTTPException(status_code=400, detail="Text is required")
-        
+        text = req.text
         logger.info(f"Synthesizing text: {text[:50]}...")
         
         # Synthesize using Hume.ai (if TTS is available)
         audio_url = await app.state.hume_client.synthesize_text(text)
         
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "audio_url": audio_url,
             "status": "success"
         })
@@ -316,10 +541,13 @@ async def get_conversation_history(session_id: str):
         List of messages in the conversation
     """
     try:
-        history = app.state.conversation_service.get_session_history(session_id)
-        return JSONResponse(content={
+        history = await run_in_threadpool(app.state.conversation_service.get_session_history, session_id)
+        return ORJSONResponse(content={
             "session_id": session_id,
-            "messages": history,
+            "messages": [
+                {"role": msg["role"], "content": msg["content"], "timestamp": format_timestamp(msg)}
+                for msg in history
+            ],
             "total_messages": len(history)
         })
     except Exception as e:
@@ -329,24 +557,18 @@ async def get_conversation_history(session_id: str):
 
 @app.get("/api/health")
 async def health_check():
-    """Health check endpoint."""
-    return JSONResponse(content={
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat()
-    })
+    """Health check endpoint (body pre-encoded once per second by tick_clock)."""
+    return Response(content=app.state.health_body, media_type="application/json")
 
 
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_panel():
+async def admin_panel(request: Request):
     """Serve the admin panel page."""
-    try:
-        with open("static/admin.html", "r") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
-        return HTMLResponse(
-            content="<h1>Error: Admin panel not found. Please ensure static/admin.html exists.</h1>",
-            status_code=404
-        )
+    return serve_html_page(
+        request,
+        getattr(app.state, "admin_page", None),
+        "Admin panel not found. Please ensure static/admin.html exists."
+    )
 
 
 def verify_admin_key(admin_key: Optional[str] = None) -> bool:
@@ -359,27 +581,28 @@ def verify_admin_key(admin_key: Optional[str] = None) -> bool:
     Returns:
         True if admin key is valid
     """
-    expected_key = os.getenv("ADMIN_KEY", "")
-    if not expected_key:
+    expected_digest = getattr(app.state, "admin_key_digest", None)
+    if expected_digest is None:
         # If no ADMIN_KEY is set, allow access (for development)
-        # In production, always set ADMIN_KEY
-        logger.warning("ADMIN_KEY not set - allowing admin access (NOT SECURE FOR PRODUCTION)")
+        # In production, always set ADMIN_KEY (warning is logged once at startup)
         return True
     
     if not admin_key:
         return False
     
-    # Simple comparison (in production, use secure comparison)
-    return admin_key == expected_key
+    # Compare fixed-length digests in constant time to avoid leaking the key through timing
+    return hmac.compare_digest(hashlib.sha256(admin_key.encode()).digest(), expected_digest)
 
 
 @app.get("/api/admin/stats")
-async def get_admin_stats(admin_key: Optional[str] = None):
+async def get_admin_stats(admin_key: Optional[str] = None, recompute: bool = False):
     """
     Get statistics about all conversations.
     
     Args:
         admin_key: Admin authentication key (query parameter)
+        recompute: Recount every stored message instead of using the running
+            counters (one-off consistency check)
         
     Returns:
         Statistics about conversations
@@ -388,27 +611,35 @@ async def get_admin_stats(admin_key: Optional[str] = None):
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid admin key")
     
     try:
-        all_sessions = app.state.conversation_service.get_all_sessions()
-        total_sessions = len(all_sessions)
-        total_messages = sum(len(messages) for messages in all_sessions.values())
-        
-        # Count messages by role
-        user_messages = 0
-        assistant_messages = 0
-        for messages in all_sessions.values():
-            for msg in messages:
-                role = msg.get("role", "")
-                if role == "user":
-                    user_messages += 1
-                elif role == "assistant":
-                    assistant_messages += 1
-        
-        return JSONResponse(content={
+        service = app.state.conversation_service
+        if recompute:
+            all_sessions = await run_in_threadpool(service.get_all_sessions)
+            total_sessions = len(all_sessions)
+            total_messages = sum(len(messages) for messages in all_sessions.values())
+            
+            # Count messages by role
+            user_messages = 0
+            assistant_messages = 0
+            for messages in all_sessions.values():
+                for msg in messages:
+                    role = msg.get("role", "")
+                    if role == "user":
+                        user_messages += 1
+                    elif role == "assistant":
+                        assistant_messages += 1
+        else:
+            counts = await run_in_threadpool(service.get_counts)
+            total_sessions = await run_in_threadpool(service.get_session_count)
+            total_messages = counts["total"]
+            user_messages = counts["user"]
+            assistant_messages = counts["assistant"]
+        
+        return ORJSONResponse(content={
             "total_sessions": total_sessions,
             "total_messages": total_messages,
             "user_messages": user_messages,
             "assistant_messages": assistant_messages,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": app.state.now_iso
         })
     except Exception as e:
         logger.error(f"Error getting admin stats: {str(e)}", exc_info=True)
@@ -430,17 +661,74 @@ async def get_all_conversations(admin_key: Optional[str] = None):
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid admin key")
     
     try:
-        conversations = app.state.conversation_service.get_all_conversations_anonymous()
-        return JSONResponse(content={
+        conversations = await run_in_threadpool(app.state.conversation_service.get_all_conversations_anonymous)
+        return ORJSONResponse(content={
             "conversations": conversations,
             "total_conversations": len(conversations),
-            "timestamp": datetime.now().isoformat()
+            "timestamp": app.state.now_iso
         })
     except Exception as e:
         logger.error(f"Error getting conversations: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error getting conversations: {str(e)}")
 
 
+CSV_HEADER = ["Session ID (Anonymized)", "Message Number", "Role", "Content", "Timestamp"]
+
+
+def iter_conversations_csv(rows: Iterator[Tuple], batch_size: int = 500) -> Iterator[bytes]:
+    """
+    Yield the CSV export in encoded batches of rows.
+    
+    Args:
+        rows: Anonymized rows from ConversationService.iter_anonymous_rows()
+        batch_size: Number of rows written before a chunk is yielded
+        
+    Yields:
+        UTF-8 encoded CSV chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_conversations_json(conversations: List[Dict], exported_at: str) -> Iterator[bytes]:
+    """
+    Yield the JSON export one conversation at a time.
+    
+    The output matches json.dumps(..., indent=2) of
+    {"exported_at", "total_conversations", "conversations"}.
+    
+    Args:
+        conversations: Anonymized conversations from ConversationService
+        exported_at: Export timestamp
+        
+    Yields:
+        UTF-8 encoded JSON chunks
+    """
+    yield (
+        b'{\n  "exported_at": ' + orjson.dumps(exported_at)
+        + b',\n  "total_conversations": ' + orjson.dumps(len(conversations))
+        + b',\n  "conversations": ['
+    )
+    for idx, conv in enumerate(conversations):
+        # Strings are escaped by orjson, so raw newlines only come from indentation
+        body = orjson.dumps(conv, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n    ")
+        yield (b",\n    " if idx else b"\n    ") + body
+    yield b"\n  ]\n}" if conversations else b"]\n}"
+
+
 @app.get("/api/admin/download/csv")
 async def download_conversations_csv(admin_key: Optional[str] = None):
     """
@@ -456,37 +744,15 @@ async def download_conversations_csv(admin_key: Optional[str] = None):
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid admin key")
     
     try:
-        conversations = app.state.conversation_service.get_all_conversations_anonymous()
-        
-        # Create CSV in memory
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(["Session ID (Anonymized)", "Message Number", "Role", "Content", "Timestamp"])
-        
-        # Write conversations
-        for conv in conversations:
-            session_id_hash = conv["session_id_hash"]
-            for idx, msg in enumerate(conv["messages"], 1):
-                writer.writerow([
-                    session_id_hash,
-                    idx,
-                    msg["role"],
-                    msg["content"],
-                    msg["timestamp"]
-                ])
-        
-        # Convert to bytes
-        csv_content = output.getvalue().encode('utf-8')
-        output.close()
+        # Lazy: rows are read as StreamingResponse iterates, which it does in the threadpool
+        rows = app.state.conversation_service.iter_anonymous_rows()
         
         # Create filename with timestamp
         filename = f"aura_conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         
-        from fastapi.responses import Response
-        return Response(
-            content=csv_content,
+        # Stream rows in batches instead of building the whole file in memory
+        return StreamingResponse(
+            iter_conversations_csv(rows),
             media_type="text/csv",
             headers={
                 "Content-Disposition": f"attachment; filename={filename}"
@@ -512,23 +778,14 @@ async def download_conversations_json(admin_key: Optional[str] = None):
         raise HTTPException(status_code=401, detail="Unauthorized: Invalid admin key")
     
     try:
-        conversations = app.state.conversation_service.get_all_conversations_anonymous()
-        
-        json_data = {
-            "exported_at": datetime.now().isoformat(),
-            "total_conversations": len(conversations),
-            "conversations": conversations
-        }
-        
-        import json as json_lib
-        json_content = json_lib.dumps(json_data, indent=2, ensure_ascii=False).encode('utf-8')
+        conversations = await run_in_threadpool(app.state.conversation_service.get_all_conversations_anonymous)
         
         # Create filename with timestamp
         filename = f"aura_conversations_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         
-        from fastapi.responses import Response
-        return Response(
-            content=json_content,
+        # Stream one conversation at a time instead of serializing the whole export at once
+        return StreamingResponse(
+            iter_conversations_json(conversations, app.state.now_iso),
             media_type="application/json",
             headers={
                 "Content-Disposition": f"attachment; filename={filename}"
@@ -539,13 +796,69 @@ async def download_conversations_json(admin_key: Optional[str] = None):
         raise HTTPException(status_code=500, detail=f"Error generating JSON: {str(e)}")
 
 
+def resolve_workers() -> int:
+    """
+    Resolve the number of uvicorn worker processes.
+    
+    WEB_CONCURRENCY (or WORKERS) always wins; "auto" sizes the pool from
+    os.cpu_count(). Without it, one worker per CPU core is used when sessions
+    live in Redis (REDIS_URL), and a single worker otherwise, because the
+    in-process ConversationService would give each worker a different slice
+    of the conversation history.
+    
+    Returns:
+        Number of worker processes to start
+    """
+    configured = (settings.web_concurrency or settings.workers or "").strip().lower()
+    if configured == "auto" or (not configured and settings.redis_url):
+        return os.cpu_count() or 1
+    if configured:
+        return max(1, int(configured))
+    return 1
+
+
+def resolve_server_impl() -> Dict[str, str]:
+    """
+    Pick the uvloop event loop and httptools HTTP parser when available.
+    
+    Both ship with uvicorn[standard] (uvloop is not available on Windows);
+    fall back to uvicorn's defaults if either can't be imported.
+    
+    Returns:
+        loop/http keyword arguments for uvicorn.run
+    """
+    impl = {"loop": "auto", "http": "auto"}
+    try:
+        import uvloop  # noqa: F401
+        impl["loop"] = "uvloop"
+    except ImportError:
+        pass
+    try:
+        import httptools  # noqa: F401
+        impl["http"] = "httptools"
+    except ImportError:
+        pass
+    return impl
+
+
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    debug = os.getenv("DEBUG", "False").lower() == "true"
+    port = settings.port
+    debug = settings.debug
+    workers = resolve_workers()
+    
+    run_kwargs = resolve_server_impl()
+    logger.info(f"Server implementation: loop={run_kwargs['loop']}, http={run_kwargs['http']}")
+    if workers > 1 and not debug:
+        logger.info(f"Starting {workers} workers (cpu_count={os.cpu_count()})")
+        if not settings.redis_url:
+            logger.warning("Conversation history is stored per worker process; set REDIS_URL to share sessions between workers.")
+        run_kwargs["workers"] = workers
+    
     uvicorn.run(
         "app:app",
         host="0.0.0.0",
         port=port,
-        reload=debug
+        reload=debug,
+        **run_kwargs
     )
@@ -0,0 +1,64 @@
+"""
+Application settings, read once from environment variables.
+"""
+
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Typed application configuration (field names map to upper-case env vars)."""
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+    # Hume.ai
+    hume_api_key: str = ""
+    hume_api_url: str = "https://api.hume.ai"
+    hume_max_rps: Optional[float] = None
+
+    # Unified LLM configuration
+    llm_provider: str = "gemini"
+    llm_api_key: str = ""
+    llm_api_url: Optional[str] = None
+    llm_model_name: str = "gemini-2.5-flash-lite"
+    llm_system_instruction: Optional[str] = None
+    llm_max_prompt_tokens: Optional[int] = None
+
+    # Legacy Google ADK configuration (fallback for the Gemini provider)
+    google_adk_api_key: str = ""
+    google_adk_api_url: str = "https://generativelanguage.googleapis.com/v1beta"
+    google_adk_model_name: Optional[str] = None
+    google_adk_system_instruction: Optional[str] = None
+
+    # Shared conversation store (Redis/Valkey); in-process when unset
+    redis_url: Optional[str] = None
+    session_cache_size: int = 256
+    # In-process store bounds (oldest messages / least recently used sessions dropped)
+    session_max_messages: Optional[int] = 1000
+    max_sessions: Optional[int] = 10000
+    # SQLite file the in-process store writes sessions through to (memory only when unset)
+    session_db_path: Optional[str] = None
+
+    # History compaction (older messages summarized beyond the token budget)
+    history_max_tokens: int = 4000
+    history_keep_recent: int = 6
+    # On-disk copy of history summaries (memory only when unset)
+    summary_cache_dir: Optional[str] = None
+
+    # Chat batching and response cache
+    chat_batch_max_size: int = 8
+    chat_batch_max_wait_ms: float = 0
+    response_cache_max_entries: int = 1024
+    response_cache_embedding_model: Optional[str] = None
+    response_cache_similarity_threshold: float = 0.92
+    response_cache_ttl_seconds: Optional[float] = None
+    response_cache_semantic_max_entries: int = 256
+
+    # Application
+    admin_key: str = ""
+    allowed_origins: str = "*"
+    port: int = 8000
+    debug: bool = False
+    web_concurrency: Optional[str] = None
+    workers: Optional[str] = None
@@ -2,12 +2,23 @@
 Google ADK (Agentic AI) client for processing user queries and generating responses.
 """
 
+import asyncio
+import hashlib
 import logging
 import httpx
-from typing import List, Dict, Optional
+import orjson
+from collections import OrderedDict
+from itertools import chain, islice
+from typing import AsyncIterator, Dict, Iterable, Optional, Sequence, Tuple
+
+from integrations.rate_limit import TokenBucket, check_status, retry_delay
+from integrations.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
+# Conversation history: a list or a (bounded) deque of {"role", "content"} messages
+History = Sequence[Dict[str, str]]
+
 
 class GoogleADKClient:
     """Client for interacting with Google ADK (Agentic AI) API."""
@@ -17,7 +28,17 @@ class GoogleADKClient:
         api_key: str, 
         api_url: str = "https://generativelanguage.googleapis.com/v1beta",
         system_instruction: Optional[str] = None,
-        model_name: str = "gemini-pro"
+        model_name: str = "gemini-pro",
+        http_client: Optional[httpx.AsyncClient] = None,
+        recent_messages: int = 20,
+        cache_buffer: int = 10,
+        summary_token_threshold: Optional[int] = 4000,
+        temperature: float = 0.7,
+        cache_responses: Optional[bool] = None,
+        response_cache_size: int = 1024,
+        response_cache_ttl: float = 300.0,
+        max_rps: Optional[float] = 1.0,
+        burst: Optional[float] = 60
     ):
         """
         Initialize Google ADK client.
@@ -30,102 +51,372 @@ class GoogleADKClient:
             model_name: Name of the Gemini model to use
                 Options: gemini-2.5-flash-lite (recommended), gemini-2.5-flash,
                         gemini-1.5-pro, gemini-1.5-flash, gemini-pro-vision (multimodal)
+            http_client: Shared, long-lived httpx.AsyncClient; a pooled client
+                owned by this instance is created when not provided
+            recent_messages: Minimum number of history messages sent for context
+            cache_buffer: Extra messages allowed to accumulate before the history
+                window moves, so the prompt prefix stays identical between calls
+                and Gemini's implicit prefix cache can be reused
+            summary_token_threshold: Estimated history size (tokens) above which
+                everything but the last recent_messages (up to recent_messages +
+                cache_buffer) messages is replaced by a summary; None disables
+                summarization
+            temperature: Sampling temperature
+            cache_responses: Serve identical get_response() calls from an
+                in-process TTL cache; defaults to on only for near-deterministic
+                sampling (temperature <= 0.2)
+            response_cache_size: Maximum number of cached responses
+            response_cache_ttl: Seconds a cached response stays valid
+            max_rps: Sustained Gemini requests per second allowed out of this
+                client (default matches the 60 RPM free tier); None disables
+                rate limiting
+            burst: Number of requests that may be sent at once before max_rps applies
         """
         self.api_key = api_key
         self.api_url = api_url.rstrip("/")
         self.system_instruction = system_instruction
+        # Built once so every request carries the same (byte-identical) system prefix
+        self._system_instruction_payload = (
+            {"parts": [{"text": system_instruction}]} if system_instruction else None
+        )
         self.model_name = model_name
+        self.recent_messages = recent_messages
+        self.cache_buffer = cache_buffer
+        self.summary_token_threshold = summary_token_threshold
+        # Summaries keyed by a hash of the summarized messages, reused until the next overflow
+        self._summaries: "OrderedDict[str, str]" = OrderedDict()
+        self._max_summaries = 256
         
-    async def get_response(
-        self,
-        message: str,
-        conversation_history: Optional[List[Dict[str, str]]] = None
-    ) -> str:
+        self.temperature = temperature
+        if cache_responses is None:
+            cache_responses = temperature <= 0.2
+        self._response_cache = TTLCache(response_cache_size, response_cache_ttl) if cache_responses else None
+        
+        # Token bucket that keeps bursts under the provider quota instead of tripping 429s
+        self._limiter = TokenBucket(max_rps, burst) if max_rps else None
+        
+        # Request URLs and headers are built once; the API key travels in the
+        # x-goog-api-key header instead of the query string so it stays out of logs
+        model_url = f"{self.api_url}/models/{self.model_name}"
+        self._url = httpx.URL(f"{model_url}:generateContent")
+        self._stream_url = httpx.URL(f"{model_url}:streamGenerateContent", params={"alt": "sse"})
+        self._headers = {
+            "Content-Type": "application/json",
+            "x-goog-api-key": api_key
+        }
+        
+        # Reuse keep-alive connections across calls instead of a new TLS handshake per request
+        self._owns_client = http_client is None
+        # HTTP/2 multiplexes concurrent generateContent calls over one TLS connection
+        self._client = http_client or httpx.AsyncClient(
+            http2=True,
+            timeout=60.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+        )
+    
+    async def _acquire(self):
+        """Wait for the outbound rate limiter, if one is configured."""
+        if self._limiter is not None:
+            await self._limiter.acquire()
+    
+    async def aclose(self):
+        """Close the HTTP client if this instance created it."""
+        if self._owns_client:
+            await self._client.aclose()
+        
+    def _history_window(self, length: int) -> int:
         """
-        Get AI response from Google ADK for a user message.
+        Index of the first history message to send, keeping the window start fixed.
+        
+        A rolling tail (history[-N:]) changes the first message on every turn and
+        invalidates the cached prompt prefix. Instead the start only advances in
+        steps of cache_buffer, so between recent_messages and
+        recent_messages + cache_buffer messages are sent and consecutive calls
+        share a byte-identical prefix.
+        """
+        overflow = length - self.recent_messages
+        if overflow <= self.cache_buffer:
+            return 0
+        return (overflow // max(self.cache_buffer, 1)) * max(self.cache_buffer, 1)
+    
+    async def _summarize(self, messages: Iterable[Dict[str, str]]) -> str:
+        """
+        Summarize conversation messages with a single generateContent call.
         
         Args:
-            message: User's message/query
-            conversation_history: Previous conversation messages for context
-                Format: [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
+            messages: Messages to summarize, oldest first
             
         Returns:
-            AI-generated response string
-            
-        Note:
-            This implementation uses Google's Generative AI API (Gemini).
-            Adjust the endpoint and model name based on your specific Google ADK setup.
+            Summary text
         """
-        try:
-            conversation_history = conversation_history or []
-            
-            # Build messages array for the API
-            messages = []
-            
-            # Add conversation history
-            for msg in conversation_history[-10:]:  # Limit to last 10 messages for context
-                messages.append({
-                    "role": msg.get("role", "user"),
-                    "parts": [{"text": msg.get("content", "")}]
-                })
-            
-            # Add current user message
+        transcript = "\n".join(
+            f"{msg.get('role', 'user')}: {msg.get('content', '')}" for msg in messages
+        )
+        payload = {
+            "contents": [{
+                "role": "user",
+                "parts": [{"text": (
+                    "Summarize for context continuity. Keep names, facts, preferences, "
+                    "decisions and open questions. Be concise.\n\n" + transcript
+                )}]
+            }],
+            "generationConfig": {"temperature": 0.2, "maxOutputTokens": 512}
+        }
+        content = orjson.dumps(payload)
+        # A 429 is retried once, like stream_response
+        for attempt in range(2):
+            await self._acquire()
+            response = await self._client.post(self._url, content=content, headers=self._headers)
+            if response.status_code != 429 or attempt == 1:
+                break
+            delay = retry_delay(response, attempt)
+            logger.warning("Google ADK rate limited (429), retrying summary in %.2fs", delay)
+            await asyncio.sleep(delay)
+        check_status(response)
+        summary = self._chunk_text(orjson.loads(response.content))
+        if not summary:
+            raise ValueError("Could not parse summary from Google ADK")
+        return summary
+    
+    async def _compact_history(self, conversation_history: History) -> Tuple[Optional[str], int]:
+        """
+        Replace everything but the recent messages of an over-budget history with a summary.
+        
+        Tokens are estimated at ~4 characters each. The split point is rounded
+        down to a multiple of cache_buffer, so between recent_messages and
+        recent_messages + cache_buffer messages stay verbatim and the same
+        summary (and prompt prefix) is reused for several turns before it has
+        to be recomputed. A new summary folds only the messages after the
+        previous one into it, so neither the prompt nor the summary call grows
+        with the conversation.
+        
+        Returns:
+            (summary or None, index of the first message not covered by it)
+        """
+        if self.summary_token_threshold is None or len(conversation_history) < 2:
+            return None, 0
+        tokens = sum(len(msg.get("content", "")) for msg in conversation_history) // 4
+        if tokens <= self.summary_token_threshold:
+            return None, 0
+        
+        step = max(self.cache_buffer, 1)
+        boundary = ((len(conversation_history) - self.recent_messages) // step) * step
+        if boundary <= 0:
+            return None, 0
+        
+        # Summaries are keyed by a hash of the messages they cover; while hashing,
+        # remember the latest earlier boundary that already has one
+        digest = hashlib.sha256()
+        previous, previous_boundary = None, 0
+        for i, msg in enumerate(islice(conversation_history, boundary)):
+            if i and i % step == 0:
+                cached = self._summaries.get(digest.hexdigest())
+                if cached is not None:
+                    previous, previous_boundary = cached, i
+            digest.update(orjson.dumps([msg.get("role", ""), msg.get("content", "")]))
+        key = digest.hexdigest()
+        
+        summary = self._summaries.get(key)
+        if summary is None:
+            newer = islice(conversation_history, previous_boundary, boundary)
+            if previous is not None:
+                newer = chain(({"role": "summary", "content": previous},), newer)
+            summary = await self._summarize(newer)
+            logger.info(
+                "Summarized %d older messages (~%d history tokens)", boundary - previous_boundary, tokens
+            )
+            self._summaries[key] = summary
+            while len(self._summaries) > self._max_summaries:
+                self._summaries.popitem(last=False)
+        else:
+            self._summaries.move_to_end(key)
+        
+        return summary, boundary
+    
+    def _build_payload(
+        self,
+        message: str,
+        conversation_history: Optional[History],
+        summary: Optional[str] = None,
+        offset: int = 0
+    ) -> Dict:
+        """
+        Build the Gemini generateContent payload.
+        
+        History is iterated in place from the window start (no slice copies),
+        so a list or a caller-owned deque(maxlen=N) can be passed directly.
+        Messages before offset are already covered by summary, and every
+        message from offset on is sent, so none falls between the summary and
+        the verbatim history. Without a summary the history is windowed.
+        """
+        conversation_history = conversation_history or ()
+        
+        # Build messages array for the API
+        messages = []
+        
+        # Summary of older turns replaces them, ahead of the verbatim history
+        if summary:
             messages.append({
                 "role": "user",
-                "parts": [{"text": message}]
+                "parts": [{"text": "[Summary] " + summary}]
             })
+        
+        # Add conversation history. The summary boundary already moves in steps
+        # of cache_buffer; otherwise use the stable-prefix window for prompt caching
+        if summary:
+            start = offset
+        else:
+            start = self._history_window(len(conversation_history))
+        for msg in islice(conversation_history, start, None):
+            messages.append({
+                "role": msg.get("role", "user"),
+                "parts": [{"text": msg.get("content", "")}]
+            })
+        
+        # Add current user message
+        messages.append({
+            "role": "user",
+            "parts": [{"text": message}]
+        })
+        
+        # Prepare request payload; the (unchanging) system instruction goes first
+        payload = {}
+        if self._system_instruction_payload:
+            payload["systemInstruction"] = self._system_instruction_payload
+        payload["contents"] = messages
+        payload["generationConfig"] = {
+            "temperature": self.temperature,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 1024,
+        }
+        
+        return payload
+    
+    @staticmethod
+    def _chunk_text(result: Dict) -> Optional[str]:
+        """Extract the text of one (streamed) Gemini response chunk."""
+        # Adjust based on actual Google ADK response structure
+        if "candidates" in result and len(result["candidates"]) > 0:
+            candidate = result["candidates"][0]
+            if "content" in candidate and "parts" in candidate["content"]:
+                parts = candidate["content"]["parts"]
+                if len(parts) > 0 and "text" in parts[0]:
+                    return parts[0]["text"]
+        
+        # Fallback parsing
+        return result.get("text")
+    
+    async def stream_response(
+        self,
+        message: str,
+        conversation_history: Optional[History] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the AI response from Google ADK as text chunks arrive.
+        
+        Args:
+            message: User's message/query
+            conversation_history: Previous conversation messages for context
             
-            # Prepare request payload
-            payload = {
-                "contents": messages,
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 1024,
-                }
-            }
-            
-            # Add system instruction if configured
-            if self.system_instruction:
-                payload["systemInstruction"] = {
-                    "parts": [{"text": self.system_instruction}]
-                }
+        Yields:
+            Response text chunks, in order
+        """
+        try:
+            conversation_history = conversation_history or ()
+            summary, offset = await self._compact_history(conversation_history)
+            payload = self._build_payload(message, conversation_history, summary, offset)
             
-            # Use Gemini API endpoint with configured model
-            url = f"{self.api_url}/models/{self.model_name}:generateContent?key={self.api_key}"
+            content = orjson.dumps(payload)
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract response text
-                # Adjust based on actual Google ADK response structure
-                if "candidates" in result and len(result["candidates"]) > 0:
-                    candidate = result["candidates"][0]
-                    if "content" in candidate and "parts" in candidate["content"]:
-                        parts = candidate["content"]["parts"]
-                        if len(parts) > 0 and "text" in parts[0]:
-                            ai_response = parts[0]["text"]
-                            logger.info(f"Successfully generated AI response: {ai_response[:50]}...")
-                            return ai_response
+            # A 429 is retried once, after Retry-After or a jittered backoff
+            for attempt in range(2):
+                await self._acquire()
+                # streamGenerateContent with alt=sse sends one JSON chunk per `data:` line
+                async with self._client.stream(
+                    "POST",
+                    self._stream_url,
+                    content=content,
+                    headers=self._headers
+                ) as response:
+                    logger.debug("Google ADK response over %s", response.http_version)
+                    if response.status_code == 429 and attempt == 0:
+                        delay = retry_delay(response, attempt)
+                    else:
+                        if response.status_code >= 400:
+                            await response.aread()
+                            check_status(response)
+                        
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            text = self._chunk_text(orjson.loads(line[5:]))
+                            if text:
+                                yield text
+                        return
                 
-                # Fallback parsing
-                if "text" in result:
-                    return result["text"]
-                
-                logger.warning("Unexpected response structure from Google ADK")
-                raise ValueError("Could not parse response from Google ADK")
+                logger.warning("Google ADK rate limited (429), retrying in %.2fs", delay)
+                await asyncio.sleep(delay)
                 
         except httpx.HTTPStatusError as e:
-            logger.error(f"Google ADK API error: {e.response.status_code} - {e.response.text}")
+            logger.error("Google ADK API error: %s - %s", e.response.status_code, e.response.text)
             raise Exception(f"Google ADK API error: {e.response.status_code} - {e.response.text}")
         except Exception as e:
-            logger.error(f"Error getting response from Google ADK: {str(e)}", exc_info=True)
+            logger.error("Error streaming response from Google ADK: %s", e, exc_info=True)
             raise
+    
+    def _response_cache_key(
+        self,
+        message: str,
+        conversation_history: Optional[History]
+    ) -> bytes:
+        """Hash everything that determines the response of a get_response() call."""
+        return hashlib.blake2b(orjson.dumps([
+            self.system_instruction,
+            self.model_name,
+            self.temperature,
+            [[msg.get("role", ""), msg.get("content", "")] for msg in conversation_history or []],
+            message
+        ]), digest_size=16).digest()
+    
+    async def get_response(
+        self,
+        message: str,
+        conversation_history: Optional[History] = None
+    ) -> str:
+        """
+        Get AI response from Google ADK for a user message.
+        
+        Args:
+            message: User's message/query
+            conversation_history: Previous conversation messages for context
+                Format: [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}];
+                a list or a deque (e.g. deque(maxlen=N) owned by the caller)
+            
+        Returns:
+            AI-generated response string
+            
+        Note:
+            This implementation uses Google's Generative AI API (Gemini).
+            Adjust the endpoint and model name based on your specific Google ADK setup.
+            The response is collected from stream_response(). Identical calls
+            are answered from the response cache when it is enabled.
+        """
+        cache_key = None
+        if self._response_cache is not None:
+            cache_key = self._response_cache_key(message, conversation_history)
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Google ADK response cache hit")
+                return cached
+        
+        chunks = [chunk async for chunk in self.stream_response(message, conversation_history)]
+        if not chunks:
+            logger.warning("Unexpected response structure from Google ADK")
+            raise ValueError("Could not parse response from Google ADK")
+        
+        ai_response = "".join(chunks)
+        logger.info("Successfully generated AI response: %.50s...", ai_response)
+        if cache_key is not None:
+            self._response_cache.set(cache_key, ai_response)
+        return ai_response
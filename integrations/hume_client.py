@@ -2,42 +2,256 @@
 Hume.ai client for speech-to-text and text-to-speech conversion.
 """
 
+import asyncio
 import logging
+import random
+import time
+import uuid
 import httpx
-from typing import Optional
+import orjson
+from typing import AsyncIterator, Collection, Optional, Tuple, Union, BinaryIO
+
+from integrations.rate_limit import TokenBucket, check_status, retry_after_seconds, retry_delay
 
 logger = logging.getLogger(__name__)
 
+# Candidate transcription endpoints, in order of preference
+BATCH_TRANSCRIPTION_ENDPOINT = "/v0/batch/transcriptions"
+JOBS_ENDPOINT = "/v0/jobs"
+TRANSCRIPTION_ENDPOINTS = (BATCH_TRANSCRIPTION_ENDPOINT, JOBS_ENDPOINT)
+
+# Audio is uploaded in chunks of this size
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+AudioInput = Union[bytes, BinaryIO, AsyncIterator[bytes]]
+
+
+def _mask_key(key: str) -> str:
+    """Mask an API key for logging."""
+    return "NOT_SET" if not key else ("***" if len(key) <= 8 else f"{key[:4]}...{key[-4:]}")
+
 
 class HumeClient:
     """Client for interacting with Hume.ai API for voice processing."""
     
-    def __init__(self, api_key: str, api_url: str = "https://api.hume.ai"):
+    def __init__(
+        self,
+        api_key: str,
+        api_url: str = "https://api.hume.ai",
+        http_client: Optional[httpx.AsyncClient] = None,
+        max_rps: Optional[float] = None,
+        burst: Optional[float] = None
+    ):
         """
         Initialize Hume.ai client.
         
         Args:
             api_key: Hume.ai API key
             api_url: Base URL for Hume.ai API
+            http_client: Shared, long-lived httpx.AsyncClient to reuse pooled
+                (keep-alive) connections; a pooled client owned by this
+                instance is created when not provided
+            max_rps: Sustained Hume.ai requests per second allowed out of this
+                client; None disables rate limiting
+            burst: Number of requests that may be sent at once before max_rps applies
         """
         self.api_key = api_key
         self.api_url = api_url.rstrip("/")
+        self.timeout = 30.0
+        self.job_poll_timeout = 10.0
+        # Transcription endpoint known to exist (resolved on first use)
+        self._transcribe_endpoint: Optional[str] = None
+        # Token bucket that keeps bursts under the Hume.ai quota instead of tripping 429s
+        self._limiter = TokenBucket(max_rps, burst) if max_rps else None
         self.headers = {
             "X-Hume-Api-Key": api_key,
             "Content-Type": "application/json"
         }
+        # Own a pooled client (closed by aclose) when no shared one is injected
+        self._owns_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(
+            http2=True,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+            headers={"X-Hume-Api-Key": api_key}
+        )
         
         # Log API key status (masked)
-        def mask_key(key: str) -> str:
-            if not key:
-                return "NOT_SET"
-            if len(key) <= 8:
-                return "***"
-            return f"{key[:4]}...{key[-4:]}"
+        logger.info("HumeClient initialized - API Key: %s, URL: %s", _mask_key(api_key), self.api_url)
+        
+    async def _acquire(self):
+        """Wait for the outbound rate limiter, if one is configured."""
+        if self._limiter is not None:
+            await self._limiter.acquire()
+    
+    async def aclose(self):
+        """Close the HTTP client if this instance created it."""
+        if self._owns_client:
+            await self.http_client.aclose()
+    
+    async def _poll_job(self, client: httpx.AsyncClient, job_url: str, headers: dict) -> Optional[str]:
+        """
+        Poll a transcription job until it completes, fails or job_poll_timeout passes.
+        
+        Polls back off exponentially (0.25s doubling to 4s, with +/-30% jitter)
+        so fast jobs are picked up quickly without hammering the API. A
+        Retry-After header on 429/503 responses takes precedence.
+        
+        Returns:
+            Transcription text, or None if the job failed or did not finish in time
+        """
+        deadline = time.monotonic() + self.job_poll_timeout
+        delay = 0.25
+        
+        while True:
+            wait = delay * (0.7 + 0.6 * random.random())
+            delay = min(delay * 2, 4.0)
+            if time.monotonic() + wait > deadline:
+                return None
+            await asyncio.sleep(wait)
+            
+            await self._acquire()
+            status_response = await client.get(job_url, headers=headers, timeout=self.timeout)
+            
+            if status_response.status_code in (429, 503):
+                retry_after = retry_after_seconds(status_response)
+                if retry_after is not None:
+                    if time.monotonic() + retry_after > deadline:
+                        return None
+                    await asyncio.sleep(retry_after)
+                continue
+            
+            if status_response.status_code == 200:
+                status_data = orjson.loads(status_response.content)
+                if status_data.get("status") == "completed":
+                    return status_data.get("transcription", "") or status_data.get("text", "")
+                elif status_data.get("status") == "failed":
+                    return None
+    
+    async def _discover_endpoint(self, client: httpx.AsyncClient, exclude: Collection[str] = ()) -> Optional[str]:
+        """
+        Find the preferred transcription endpoint that exists and cache it.
+        
+        All candidates are probed concurrently with a body-less OPTIONS request,
+        so discovery costs one round trip and no audio is uploaded to endpoints
+        that turn out to be missing.
+        
+        Args:
+            client: HTTP client to probe with
+            exclude: Endpoints not to consider (e.g. one whose upload just
+                returned 404 although it answers OPTIONS)
+        
+        Returns:
+            Endpoint path, or None if none of the candidates exist
+        """
+        async def probe(path: str) -> httpx.Response:
+            await self._acquire()
+            return await client.options(
+                f"{self.api_url}{path}",
+                headers={"X-Hume-Api-Key": self.api_key},
+                timeout=self.timeout
+            )
+        
+        candidates = [path for path in TRANSCRIPTION_ENDPOINTS if path not in exclude]
+        results = await asyncio.gather(
+            *(probe(path) for path in candidates),
+            return_exceptions=True
+        )
+        for path, result in zip(candidates, results):
+            if isinstance(result, Exception):
+                logger.warning("Hume.ai transcription endpoint %s probe failed: %s", path, result)
+            elif result.status_code == 404:
+                logger.warning("Hume.ai transcription endpoint %s not found (404)", path)
+            else:
+                self._transcribe_endpoint = path
+                return path
+        return None
+    
+    async def _transcribe_via(
+        self,
+        client: httpx.AsyncClient,
+        path: str,
+        audio_data: AudioInput,
+        content_type: str
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Upload audio to one transcription endpoint.
+        
+        The batch endpoint answers with the transcription; the jobs endpoint
+        answers with a job ID that is polled until it completes.
+        
+        Returns:
+            (HTTP status code of the upload, transcription or None)
+        """
+        headers = {"X-Hume-Api-Key": self.api_key}
+        # Bytes and file objects can be re-sent once after a 429; async iterators can't
+        attempts = 2 if isinstance(audio_data, (bytes, bytearray)) or hasattr(audio_data, "read") else 1
+        for attempt in range(attempts):
+            await self._acquire()
+            body, body_type = self._multipart_body(audio_data, content_type)
+            response = await client.post(
+                f"{self.api_url}{path}",
+                content=body,
+                headers={**headers, "Content-Type": body_type},
+                timeout=self.timeout
+            )
+            if response.status_code != 429 or attempt == attempts - 1:
+                break
+            delay = retry_delay(response, attempt)
+            logger.warning("Hume.ai rate limited (429), retrying in %.2fs", delay)
+            await asyncio.sleep(delay)
+        
+        if response.status_code != 200:
+            return response.status_code, None
         
-        logger.info(f"HumeClient initialized - API Key: {mask_key(api_key)}, URL: {self.api_url}")
+        result = orjson.loads(response.content)
+        if path == JOBS_ENDPOINT:
+            job_id = result.get("job_id") or result.get("id")
+            if not job_id:
+                return response.status_code, None
+            # Poll for job completion
+            return response.status_code, await self._poll_job(client, f"{self.api_url}{path}/{job_id}", headers)
         
-    async def transcribe_audio(self, audio_data: bytes) -> str:
+        return response.status_code, result.get("transcription", "") or result.get("text", "") or result.get("transcript", "")
+    
+    @staticmethod
+    def _multipart_body(audio_data: AudioInput, content_type: str) -> Tuple[AsyncIterator[bytes], str]:
+        """
+        Frame audio as a streaming multipart/form-data body.
+        
+        The multipart framing is written around the audio chunks as they are
+        read, so only one chunk is held in memory regardless of audio length.
+        
+        Returns:
+            (body chunks, Content-Type header with the boundary)
+        """
+        boundary = uuid.uuid4().hex
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="audio"; filename="audio.wav"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+        
+        async def body() -> AsyncIterator[bytes]:
+            yield head
+            if isinstance(audio_data, (bytes, bytearray)):
+                yield bytes(audio_data)
+            elif hasattr(audio_data, "read"):
+                # File objects may be disk-backed (e.g. an UploadFile's spooled
+                # temporary file), so reads run in a thread off the event loop.
+                # Rewind so the same file object can be re-sent
+                await asyncio.to_thread(audio_data.seek, 0)
+                while chunk := await asyncio.to_thread(audio_data.read, UPLOAD_CHUNK_SIZE):
+                    yield chunk
+            else:
+                async for chunk in audio_data:
+                    yield chunk
+            yield tail
+        
+        return body(), f"multipart/form-data; boundary={boundary}"
+    
+    async def transcribe_audio(self, audio_data: AudioInput, content_type: str = "audio/wav") -> str:
         """
         Transcribe audio to text using Hume.ai speech-to-text.
         
@@ -48,7 +262,10 @@ class HumeClient:
         otherwise falls back to a placeholder that indicates the limitation.
         
         Args:
-            audio_data: Raw audio bytes (WAV, MP3, etc.)
+            audio_data: Raw audio bytes (WAV, MP3, etc.), a binary file object or
+                an async iterator of byte chunks; file objects and iterators are
+                streamed to Hume.ai in chunks instead of being loaded into memory
+            content_type: MIME type of the audio
             
         Returns:
             Transcribed text string
@@ -64,97 +281,45 @@ class HumeClient:
             # 2. Use browser's Web Speech API (already implemented in frontend)
             # 3. Use Hume's batch processing API if available
             
-            # Try alternative endpoints that might exist
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                # Option 1: Try batch transcription endpoint (if it exists)
-                url = f"{self.api_url}/v0/batch/transcriptions"
-                
-                files = {
-                    "audio": ("audio.wav", audio_data, "audio/wav")
-                }
-                
-                headers = {
-                    "X-Hume-Api-Key": self.api_key
-                }
-                
-                try:
-                    response = await client.post(
-                        url,
-                        files=files,
-                        headers=headers
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        transcription = result.get("transcription", "") or result.get("text", "") or result.get("transcript", "")
-                        
-                        if transcription:
-                            logger.info(f"Successfully transcribed audio: {transcription[:50]}...")
-                            return transcription
-                    
-                except httpx.HTTPStatusError as e:
-                    if e.response.status_code == 404:
-                        logger.warning(f"Hume.ai batch transcription endpoint not found (404). Trying alternative...")
-                    else:
-                        raise
-                
-                # Option 2: Try jobs API (if available)
-                url = f"{self.api_url}/v0/jobs"
-                
-                try:
-                    # Create a job for transcription
-                    job_response = await client.post(
-                        url,
-                        files=files,
-                        headers=headers
-                    )
-                    
-                    if job_response.status_code == 200:
-                        job_result = job_response.json()
-                        job_id = job_result.get("job_id") or job_result.get("id")
-                        
-                        if job_id:
-                            # Poll for job completion
-                            job_url = f"{self.api_url}/v0/jobs/{job_id}"
-                            import asyncio
-                            
-                            for _ in range(10):  # Poll up to 10 times
-                                await asyncio.sleep(1)
-                                status_response = await client.get(job_url, headers=headers)
-                                
-                                if status_response.status_code == 200:
-                                    status_data = status_response.json()
-                                    if status_data.get("status") == "completed":
-                                        transcription = status_data.get("transcription", "") or status_data.get("text", "")
-                                        if transcription:
-                                            logger.info(f"Successfully transcribed audio via job: {transcription[:50]}...")
-                                            return transcription
-                                    elif status_data.get("status") == "failed":
-                                        break
-                        
-                except httpx.HTTPStatusError:
-                    pass  # Jobs API might not exist either
-                
-                # If all endpoints fail, raise informative error
-                raise Exception(
-                    "Hume.ai does not provide a simple transcription endpoint. "
-                    "Hume.ai EVI is designed for conversational AI with Configuration IDs. "
-                    "For simple speech-to-text, consider using:\n"
-                    "1. Browser's Web Speech API (already available in frontend)\n"
-                    "2. Google Cloud Speech-to-Text API\n"
-                    "3. OpenAI Whisper API\n"
-                    "4. AssemblyAI or other transcription services"
-                )
+            # The working endpoint is resolved once and cached, so the audio is
+            # uploaded a single time instead of once per candidate endpoint
+            client = self.http_client
+            path = self._transcribe_endpoint or await self._discover_endpoint(client)
+            if path:
+                status_code, transcription = await self._transcribe_via(client, path, audio_data, content_type)
+                if status_code == 404:
+                    # Endpoint disappeared; invalidate the cache and try the other candidates once
+                    logger.warning("Hume.ai transcription endpoint %s returned 404, rediscovering...", path)
+                    self._transcribe_endpoint = None
+                    path = await self._discover_endpoint(client, exclude=(path,))
+                    # An async iterator has been consumed by the first upload and can't be re-sent
+                    if path and (isinstance(audio_data, (bytes, bytearray)) or hasattr(audio_data, "read")):
+                        status_code, transcription = await self._transcribe_via(client, path, audio_data, content_type)
                 
+                if transcription:
+                    logger.info("Successfully transcribed audio via %s: %.50s...", path, transcription)
+                    return transcription
+            
+            # If all endpoints fail, raise informative error
+            raise Exception(
+                "Hume.ai does not provide a simple transcription endpoint. "
+                "Hume.ai EVI is designed for conversational AI with Configuration IDs. "
+                "For simple speech-to-text, consider using:\n"
+                "1. Browser's Web Speech API (already available in frontend)\n"
+                "2. Google Cloud Speech-to-Text API\n"
+                "3. OpenAI Whisper API\n"
+                "4. AssemblyAI or other transcription services"
+            )
+            
         except httpx.HTTPStatusError as e:
             error_detail = ""
             try:
-                error_response = e.response.json()
+                error_response = orjson.loads(e.response.content)
                 error_detail = error_response.get("detail", "") or error_response.get("message", "")
             except:
                 error_detail = e.response.text[:200] if e.response.text else ""
             
-            logger.error(f"Hume.ai API error: {e.response.status_code} - {error_detail}")
+            logger.error("Hume.ai API error: %s - %s", e.response.status_code, error_detail)
             raise Exception(
                 f"Hume.ai API error ({e.response.status_code}): "
                 f"Hume.ai EVI is designed for conversational AI, not simple transcription. "
@@ -164,7 +329,7 @@ class HumeClient:
         except Exception as e:
             if "does not provide" in str(e) or "Hume.ai EVI" in str(e):
                 raise  # Re-raise informative errors
-            logger.error(f"Error transcribing audio with Hume.ai: {str(e)}", exc_info=True)
+            logger.error("Error transcribing audio with Hume.ai: %s", e, exc_info=True)
             raise Exception(f"Error transcribing audio: {str(e)}")
     
     async def synthesize_text(self, text: str) -> Optional[str]:
@@ -185,33 +350,35 @@ class HumeClient:
             # Note: Check if Hume.ai supports TTS in their API
             # This is a placeholder implementation
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                url = f"{self.api_url}/v0/evi/synthesize"  # Adjust endpoint as needed
-                
-                payload = {
-                    "text": text,
-                    "voice": "default"  # Adjust based on available voices
-                }
-                
-                response = await client.post(
-                    url,
-                    json=payload,
-                    headers=self.headers
-                )
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract audio URL or data
-                audio_url = result.get("audio_url") or result.get("url")
-                
-                logger.info(f"Successfully synthesized text to speech")
-                return audio_url
-                
+            client = self.http_client
+            url = f"{self.api_url}/v0/evi/synthesize"  # Adjust endpoint as needed
+            
+            payload = {
+                "text": text,
+                "voice": "default"  # Adjust based on available voices
+            }
+            
+            await self._acquire()
+            response = await client.post(
+                url,
+                content=orjson.dumps(payload),
+                headers=self.headers,
+                timeout=self.timeout
+            )
+            
+            check_status(response)
+            result = orjson.loads(response.content)
+            
+            # Extract audio URL or data
+            audio_url = result.get("audio_url") or result.get("url")
+            
+            logger.info("Successfully synthesized text to speech")
+            return audio_url
+            
         except httpx.HTTPStatusError as e:
-            logger.warning(f"Hume.ai TTS may not be available: {e.response.status_code}")
+            logger.warning("Hume.ai TTS may not be available: %s", e.response.status_code)
             # TTS might not be available, return None
             return None
         except Exception as e:
-            logger.warning(f"Error synthesizing text with Hume.ai: {str(e)}")
+            logger.warning("Error synthesizing text with Hume.ai: %s", e)
             return None
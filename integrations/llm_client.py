@@ -3,13 +3,106 @@ Unified LLM client supporting multiple providers including open-source models.
 Supports: Google Gemini, OpenAI-compatible APIs (Ollama, vLLM, Together AI, etc.)
 """
 
+import asyncio
+import functools
+import hashlib
 import logging
 import httpx
-from typing import List, Dict, Optional
+import orjson
+from itertools import chain, islice
+from typing import AsyncIterator, Iterable, List, Dict, Optional, Protocol, Sequence, Tuple, Union
 from enum import Enum
 
+from integrations.prompt_assembler import PromptAssembler
+from integrations.rate_limit import backoff_delay, check_status, retry_delay
+from integrations.ttl_cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
+# Response bodies larger than this are decoded in a worker thread
+OFFLOAD_DECODE_BYTES = 4 * 1024
+
+# Speaker labels for the Hugging Face plain-text prompt
+_HF_ROLE_LABEL = {"user": "User", "assistant": "Assistant", "system": "System"}
+
+# Transient failures worth retrying; other 4xx (bad request, auth) fail immediately
+RETRYABLE_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# System instruction for summary requests (used instead of the agent's persona)
+SUMMARY_SYSTEM_INSTRUCTION = (
+    "You summarize conversations for context continuity. Keep names, facts, "
+    "preferences, decisions and open questions. Be concise and neutral; do not "
+    "answer or continue the conversation."
+)
+
+
+def _approx_tokens(text: Optional[str]) -> int:
+    """Rough token count for a prompt string (~4 characters per token)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+# Pooled client shared by every LLMClient that isn't given one (see _get_shared_client)
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+def _new_pooled_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP client used when none is injected."""
+    # HTTP/2 multiplexes concurrent requests (see get_responses) over one
+    # connection with compressed headers; HTTP/1.1-only servers such as a
+    # local Ollama are negotiated down transparently
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=60.0,
+        limits=httpx.Limits(
+            max_connections=100,
+            max_keepalive_connections=32,
+            keepalive_expiry=60.0
+        )
+    )
+
+
+def _get_shared_client() -> httpx.AsyncClient:
+    """
+    Return the module-wide pooled client, creating it on first use.
+    
+    Several LLMClient instances (one per provider or model in an ensemble or
+    eval harness) then share connections, TLS sessions and DNS lookups.
+    Creation doesn't await, so concurrent first calls on one event loop can't
+    create two clients and no lock is needed.
+    """
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = _new_pooled_client()
+    return _shared_client
+
+
+async def aclose_shared_client():
+    """Close the module-wide pooled client, if one was created (call on shutdown)."""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
+
+
+@functools.lru_cache(maxsize=128)
+def _mask_key(key: Optional[str]) -> str:
+    """Mask an API key for logging, keeping only its first and last 4 characters."""
+    if not key:
+        return "NOT_SET"
+    if len(key) <= 8:
+        return "***"
+    return f"{key[:4]}...{key[-4:]}"
+
+
+class ResponseCacheLike(Protocol):
+    """Response cache interface accepted by LLMClient (see services.response_cache)."""
+    
+    async def get(self, message: str, conversation_history: Optional[Sequence[Dict[str, str]]] = None) -> Optional[str]:
+        ...
+    
+    async def put(self, message: str, conversation_history: Optional[Sequence[Dict[str, str]]], response: str):
+        ...
+
 
 class LLMProvider(str, Enum):
     """Supported LLM providers."""
@@ -28,6 +121,15 @@ class LLMClient:
         api_url: Optional[str] = None,
         model_name: str = "gemini-2.5-flash-lite",
         system_instruction: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        semantic_cache: Optional["ResponseCacheLike"] = None,
+        temperature: float = 0.7,
+        pinned_messages: int = 2,
+        exact_cache_size: int = 1024,
+        exact_cache_ttl: float = 300.0,
+        max_prompt_tokens: Optional[int] = None,
+        max_retries: int = 3,
+        shared_client: bool = True,
         **kwargs
     ):
         """
@@ -45,13 +147,50 @@ class LLMClient:
                 - OpenAI-compatible: llama3.2, mistral, etc. (depends on provider)
                 - Hugging Face: meta-llama/Llama-3.2-3B-Instruct, etc.
             system_instruction: System prompt/instruction for the AI agent
+            http_client: Shared, long-lived httpx.AsyncClient to reuse pooled
+                (keep-alive) connections; a pooled client is created on first
+                use when not provided
+            semantic_cache: Optional response cache (e.g. services.response_cache.
+                ResponseCache: exact match, then embedding similarity) consulted
+                before calling the provider and filled after every miss
+            temperature: Sampling temperature for every provider
+            pinned_messages: Number of opening history messages always sent ahead
+                of the recent tail, so system instruction + pinned messages form
+                a prefix that never changes and stays in the provider's prompt cache
+            exact_cache_size: Entries in the exact-match cache used for
+                deterministic calls (temperature <= 0.01)
+            exact_cache_ttl: Seconds an exact-match cache entry stays valid
+            max_prompt_tokens: Estimated token budget for each prompt (system
+                instruction, history, context and message); the oldest unpinned
+                history messages are left out to fit. None sends the whole window
+            max_retries: Retries for a request that times out or gets a transient
+                status (408, 425, 429, 5xx gateway/unavailable), with exponential
+                backoff and jitter or the server's Retry-After
+            shared_client: Without http_client, use the module-wide pooled client
+                shared by all LLMClient instances (closed by aclose_shared_client())
+                rather than one owned by this instance
             **kwargs: Additional provider-specific arguments
+            
+        Note:
+            LLMClient is meant to be long-lived: create it once and call aclose()
+            on shutdown so pooled connections are reused across requests.
         """
         self.provider = provider.lower()
         self.api_key = api_key
         self.api_url = api_url
         self.model_name = model_name
         self.system_instruction = system_instruction
+        self.http_client = http_client
+        self._owns_client = http_client is None and not shared_client
+        self.semantic_cache = semantic_cache
+        self.temperature = temperature
+        self.pinned_messages = pinned_messages
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_retries = max_retries
+        # Client used by summarize() (see _get_summary_client)
+        self._summary_client: Optional["LLMClient"] = None
+        # Deterministic calls always produce the same reply, so identical requests can be replayed
+        self._exact_cache = TTLCache(exact_cache_size, exact_cache_ttl) if temperature <= 0.01 else None
         
         # Set default URLs based on provider
         if not self.api_url:
@@ -65,20 +204,136 @@ class LLMClient:
         # Provider-specific config
         self.kwargs = kwargs
         
-        # Log configuration (mask API key)
-        def mask_key(key: Optional[str]) -> str:
-            if not key:
-                return "NOT_SET"
-            if len(key) <= 8:
-                return "***"
-            return f"{key[:4]}...{key[-4:]}"
+        self._masked_api_key = _mask_key(self.api_key)
+        
+        # Everything that only depends on configuration is resolved once here
+        # instead of on every request
+        base_url = (self.api_url or "").rstrip("/")
+        self._gemini_url_template = f"{self.api_url}/models/{self.model_name}:{{method}}"
+        self._gemini_generate_url = self._gemini_url("generateContent")
+        self._gemini_stream_url = self._gemini_url("streamGenerateContent", "alt=sse")
+        self._chat_url = f"{base_url}/chat/completions"
+        self._completions_url = f"{base_url}/completions"
+        self._hf_url = f"{base_url}/models/{self.model_name}"
+        self._default_headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            if self.provider == "gemini":
+                # Sent as a header so the request URL never carries the key
+                self._default_headers["x-goog-api-key"] = self.api_key
+            else:
+                self._default_headers["Authorization"] = f"Bearer {self.api_key}"
+        
+        # Payload parts that are identical on every request; built once and shared
+        # by reference (orjson serializes them as-is, they are never mutated)
+        system_text = (self.system_instruction or "").strip()
+        self._system_tokens = _approx_tokens(system_text)
+        self._gemini_system_instruction = {"parts": [{"text": system_text}]} if system_text else None
+        self._gemini_generation_config = {
+            "temperature": self.temperature,
+            "topK": 40,
+            "topP": 0.95,
+            "maxOutputTokens": 1024,
+        }
+        self._hf_parameters = {
+            "temperature": self.temperature,
+            "max_new_tokens": 1024,
+            "return_full_text": False
+        }
+        
+        # Provider handlers; None for an unknown provider (raised on first use)
+        self._dispatch = {
+            "gemini": self._get_gemini_response,
+            "openai_compatible": self._get_openai_compatible_response,
+            "huggingface": self._get_huggingface_response,
+        }.get(self.provider)
+        self._stream_dispatch = {
+            "gemini": self._stream_gemini_response,
+            "openai_compatible": self._stream_openai_compatible_response,
+            "huggingface": self._stream_huggingface_response,
+        }.get(self.provider)
+        
+        logger.info(
+            "LLMClient initialized - Provider: %s, Model: %s, API Key: %s, URL: %s",
+            self.provider, self.model_name, self._masked_api_key, self.api_url
+        )
         
-        logger.info(f"LLMClient initialized - Provider: {self.provider}, Model: {self.model_name}, API Key: {mask_key(self.api_key)}, URL: {self.api_url}")
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Return the HTTP client used for every request.
+        
+        The injected client when given; otherwise the module-wide shared client,
+        or (shared_client=False) a pooled client owned by this instance, created
+        on first use and kept until aclose().
+        """
+        if self.http_client is None:
+            if not self._owns_client:
+                return _get_shared_client()
+            self.http_client = _new_pooled_client()
+        return self.http_client
+    
+    async def aclose(self):
+        """Close the HTTP client if this instance created it."""
+        if self._owns_client and self.http_client is not None:
+            await self.http_client.aclose()
+            self.http_client = None
+    
+    async def _post(self, url: str, payload: Union[Dict, bytes], headers: Dict[str, str]) -> httpx.Response:
+        """
+        POST a JSON payload, retrying transient failures.
+        
+        Timeouts, connection errors and RETRYABLE_STATUS_CODES are retried up
+        to max_retries times; the wait honours Retry-After when the server sends
+        one, otherwise it is exponential backoff with jitter. The payload is
+        encoded once for all attempts (already encoded bytes are sent as-is).
+        
+        Returns:
+            The successful response
+            
+        Raises:
+            httpx.HTTPStatusError: Non-retryable status, or retries exhausted
+            httpx.TransportError: Network failure after the last retry
+        """
+        client = self._get_client()
+        content = payload if isinstance(payload, bytes) else orjson.dumps(payload)
+        attempt = 0
+        while True:
+            try:
+                response = await client.post(url, content=content, headers=headers)
+            except (httpx.TimeoutException, httpx.NetworkError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning("%s request failed (%s), retrying in %.1fs", self.provider, e, delay)
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    check_status(response)
+                    return response
+                delay = retry_delay(response, attempt)
+                logger.warning(
+                    "%s API returned %s, retrying in %.1fs", self.provider, response.status_code, delay
+                )
+            attempt += 1
+            await asyncio.sleep(delay)
+    
+    @staticmethod
+    async def _decode(response: httpx.Response):
+        """
+        Parse a JSON response body.
         
+        Bodies over OFFLOAD_DECODE_BYTES (e.g. batched completions) are parsed
+        with asyncio.to_thread so the event loop keeps serving other requests;
+        small ones stay on the loop, where parsing is cheaper than a thread hop.
+        """
+        raw = response.content
+        if len(raw) > OFFLOAD_DECODE_BYTES:
+            return await asyncio.to_thread(orjson.loads, raw)
+        return orjson.loads(raw)
+    
     async def get_response(
         self,
         message: str,
-        conversation_history: Optional[List[Dict[str, str]]] = None
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        dynamic_context: Optional[str] = None
     ) -> str:
         """
         Get AI response from the configured LLM provider.
@@ -87,285 +342,732 @@ class LLMClient:
             message: User's message/query
             conversation_history: Previous conversation messages for context
                 Format: [{"role": "user", "content": "..."}, {"role": "assistant", "content": "..."}]
+            dynamic_context: Optional per-turn context, sent after the history so the
+                system instruction + history prefix stays cacheable by the provider
             
         Returns:
             AI-generated response string
         """
-        if self.provider == "gemini":
-            return await self._get_gemini_response(message, conversation_history)
-        elif self.provider == "openai_compatible":
-            return await self._get_openai_compatible_response(message, conversation_history)
-        elif self.provider == "huggingface":
-            return await self._get_huggingface_response(message, conversation_history)
-        else:
+        exact_key = None
+        if self._exact_cache is not None:
+            exact_key = self._exact_cache_key(message, conversation_history, dynamic_context)
+            cached = self._exact_cache.get(exact_key)
+            if cached is not None:
+                return cached
+        
+        # Per-turn context isn't part of the cache key, so those calls bypass the cache
+        cache = self.semantic_cache if not dynamic_context else None
+        if cache is not None:
+            cached = await cache.get(message, conversation_history)
+            if cached is not None:
+                return cached
+        
+        if self._dispatch is None:
             raise ValueError(f"Unsupported provider: {self.provider}")
+        response = await self._dispatch(message, conversation_history, dynamic_context)
+        
+        if cache is not None:
+            await cache.put(message, conversation_history, response)
+        if exact_key is not None:
+            self._exact_cache.set(exact_key, response)
+        return response
     
-    async def _get_gemini_response(
+    def _exact_cache_key(
         self,
         message: str,
-        conversation_history: Optional[List[Dict[str, str]]]
+        conversation_history: Optional[Sequence[Dict[str, str]]],
+        dynamic_context: Optional[str]
     ) -> str:
-        """Get response from Google Gemini API."""
-        try:
-            # Validate inputs
-            if not message or not message.strip():
-                raise ValueError("Message cannot be empty")
-            
-            if not self.api_key:
-                logger.error("Gemini API key is not configured")
-                raise ValueError("Gemini API key is not configured. Please set GOOGLE_ADK_API_KEY or LLM_API_KEY in your .env file")
+        """SHA-256 over everything that determines a deterministic response."""
+        return hashlib.sha256(orjson.dumps({
+            "provider": self.provider,
+            "model": self.model_name,
+            "system": self.system_instruction,
+            "history": [
+                [msg.get("role", ""), msg.get("content", "")] for msg in conversation_history or []
+            ],
+            "context": dynamic_context,
+            "message": message
+        }, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    
+    def _get_summary_client(self) -> "LLMClient":
+        """
+        Return the client summarize() sends its requests through.
+        
+        Same provider, model and connection pool, but with a neutral
+        summarization system instruction and no response caches, created on
+        first use.
+        """
+        if self._summary_client is None:
+            self._summary_client = LLMClient(
+                provider=self.provider,
+                api_key=self.api_key,
+                api_url=self.api_url,
+                model_name=self.model_name,
+                system_instruction=SUMMARY_SYSTEM_INSTRUCTION,
+                http_client=self._get_client() if self._owns_client else self.http_client,
+                temperature=self.temperature,
+                pinned_messages=0,
+                exact_cache_size=0,
+                max_retries=self.max_retries,
+                shared_client=True,
+                **self.kwargs
+            )
+        return self._summary_client
+    
+    async def summarize(self, messages: Iterable[Dict[str, str]]) -> str:
+        """
+        Summarize conversation messages for context continuity.
+        
+        The request goes straight to the provider under a neutral system
+        instruction: it never reads or fills the exact-match or semantic
+        response caches, so summaries can't be served to (or evict) chat turns.
+        
+        Args:
+            messages: Messages to summarize
             
-            # Log API key status (masked)
-            def mask_key(key: str) -> str:
-                if len(key) <= 8:
-                    return "***"
-                return f"{key[:4]}...{key[-4:]}"
+        Returns:
+            Summary text
+        """
+        transcript = "\n".join(
+            f"{msg.get('role', 'user').capitalize()}: {msg.get('content', '')}" for msg in messages
+        )
+        client = self._get_summary_client()
+        if client._dispatch is None:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+        return await client._dispatch(
+            "Summarize the following conversation.\n\n" + transcript, None, None
+        )
+    
+    async def stream_response(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        dynamic_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the AI response from the configured LLM provider as it is generated.
+        
+        Args:
+            message: User's message/query
+            conversation_history: Previous conversation messages for context
+            dynamic_context: Optional per-turn context (see get_response)
             
-            logger.debug(f"Using Gemini API key: {mask_key(self.api_key)}")
+        Yields:
+            Response text chunks, in order (a cached response arrives as one chunk)
+        """
+        cache = self.semantic_cache if not dynamic_context else None
+        if cache is not None:
+            cached = await cache.get(message, conversation_history)
+            if cached is not None:
+                yield cached
+                return
+        
+        if self._stream_dispatch is None:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+        stream = self._stream_dispatch(message, conversation_history, dynamic_context)
+        
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        
+        if cache is not None:
+            await cache.put(message, conversation_history, "".join(chunks))
+    
+    async def get_responses_batch(
+        self,
+        requests: List[Tuple[str, Optional[List[Dict[str, str]]]]]
+    ) -> List[Union[str, BaseException]]:
+        """
+        Get AI responses for several messages in one concurrent round.
+        
+        Args:
+            requests: List of (message, conversation_history) pairs
             
-            conversation_history = conversation_history or []
+        Returns:
+            Responses in request order; a failed request holds the raised exception
+            instead of a string so one bad call doesn't fail the whole batch
+        """
+        return await self.get_responses(
+            [message for message, _ in requests],
+            [history for _, history in requests]
+        )
+    
+    async def get_responses(
+        self,
+        messages: List[str],
+        histories: Optional[List[Optional[List[Dict[str, str]]]]] = None,
+        max_concurrency: int = 16
+    ) -> List[Union[str, BaseException]]:
+        """
+        Get AI responses for many messages concurrently (evaluations, multi-prompt jobs).
+        
+        Every request is submitted before any is awaited, with at most
+        max_concurrency in flight at once. Local OpenAI-compatible servers only
+        answer concurrently if configured to (e.g. OLLAMA_NUM_PARALLEL for Ollama);
+        otherwise requests queue on the server.
+        
+        Args:
+            messages: User messages
+            histories: Conversation history per message (same length as messages), if any
+            max_concurrency: Maximum number of simultaneous provider requests
             
-            # Build messages array for Gemini API
-            messages = []
+        Returns:
+            Responses in message order; a failed request holds the raised exception
+            instead of a string so one bad call doesn't fail the whole batch
+        """
+        if histories is None:
+            histories = [None] * len(messages)
+        elif len(histories) != len(messages):
+            raise ValueError("histories must have one entry per message")
+        
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        
+        async def bounded(message: str, history: Optional[List[Dict[str, str]]]) -> str:
+            async with semaphore:
+                return await self.get_response(message, history)
+        
+        return await asyncio.gather(
+            *(bounded(message, history) for message, history in zip(messages, histories)),
+            return_exceptions=True
+        )
+    
+    def _reserved_tokens(self, message: str, dynamic_context: Optional[str]) -> int:
+        """Estimated tokens of everything in a prompt except the history."""
+        return self._system_tokens + _approx_tokens(message) + _approx_tokens(dynamic_context)
+    
+    def _select_history(
+        self,
+        conversation_history: Sequence[Dict[str, str]],
+        window: int,
+        reserved_tokens: int = 0
+    ) -> Iterable[Dict[str, str]]:
+        """
+        Pick the history messages to send: a pinned prefix plus a stepped tail.
+        
+        The first pinned_messages messages are always sent, so the system
+        instruction and the opening of the conversation form a prefix that is
+        identical on every call. The tail after them doesn't roll by one message
+        per turn (which would shift everything after the pinned prefix); its
+        start advances in steps of window // 2, so it holds between window and
+        1.5 * window messages and consecutive calls share everything up to the
+        newest turns.
+        
+        With max_prompt_tokens set, tail messages are counted newest to oldest
+        (~4 characters per token) and older ones are dropped once the budget is
+        spent; the trimmed start is rounded to the same step so it stays stable
+        across turns. Pinned messages are always kept.
+        
+        A history that starts with a system message has been compacted by the
+        caller (see ConversationService.get_compacted_history): that summary
+        stands for everything before the messages after it, which no longer
+        start at the conversation's opening. Nothing is pinned then; the
+        summary is always sent and the messages after it aren't windowed, so
+        none of them is dropped without being covered (only the token budget
+        still trims the oldest).
+        
+        Args:
+            conversation_history: Conversation messages, oldest first
+            window: Minimum number of recent messages to keep
+            reserved_tokens: Estimated tokens of the non-history parts of the
+                prompt (system instruction, context, message)
             
-            # Add conversation history
-            # Note: Gemini API uses "model" for assistant responses, not "assistant"
-            for msg in conversation_history[-10:]:  # Limit to last 10 messages
-                role = msg.get("role", "user")
-                content = msg.get("content", "").strip()
-                if content:  # Only add non-empty messages
-                    # Convert "assistant" to "model" for Gemini API
-                    gemini_role = "model" if role == "assistant" else "user"
-                    messages.append({
-                        "role": gemini_role,
-                        "parts": [{"text": content}]
-                    })
+        Returns:
+            Messages to send, oldest first, as a lazy view over conversation_history
+            (nothing is copied; consume it once)
+        """
+        total = len(conversation_history)
+        step = max(window // 2, 1)
+        if total and conversation_history[0].get("role") == "system":
+            # Compacted history: keep the summary and everything it leads into
+            pinned = start = 1
+        else:
+            pinned = min(self.pinned_messages, total)
+            overflow = total - pinned - window
+            start = pinned + (overflow // step) * step if overflow >= step else pinned
+        
+        if self.max_prompt_tokens is not None:
+            budget = self.max_prompt_tokens - reserved_tokens - sum(
+                _approx_tokens(msg.get("content")) for msg in islice(conversation_history, pinned)
+            )
+            fit = total
+            while fit > start:
+                budget -= _approx_tokens(conversation_history[fit - 1].get("content"))
+                if budget < 0:
+                    break
+                fit -= 1
+            if fit > start:
+                # Round up to the next step so the trimmed tail start is stable too
+                start = min(pinned + -(-(fit - pinned) // step) * step, total)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            # Stays the same across turns while the cached prefix is reused
+            prefix = [self.system_instruction or ""] + [
+                msg.get("content", "") for msg in chain(
+                    islice(conversation_history, pinned),
+                    islice(conversation_history, start, start + 1)
+                )
+            ]
+            logger.debug(
+                "prefix_cache_key=%s (history %d of %d messages, tail starts at %d)",
+                hashlib.blake2b(orjson.dumps(prefix), digest_size=8).hexdigest(),
+                pinned + total - start, total, start
+            )
+        return chain(islice(conversation_history, pinned), islice(conversation_history, start, None))
+    
+    def _build_gemini_payload(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
+    ) -> Dict:
+        """Validate inputs and build the Gemini generateContent payload."""
+        # Validate inputs
+        if not message or not message.strip():
+            raise ValueError("Message cannot be empty")
+        
+        if not self.api_key:
+            logger.error("Gemini API key is not configured")
+            raise ValueError("Gemini API key is not configured. Please set GOOGLE_ADK_API_KEY or LLM_API_KEY in your .env file")
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Using Gemini API key: %s", self._masked_api_key)
+        
+        conversation_history = conversation_history or []
+        
+        # Build messages array for Gemini API
+        # (system instruction goes in systemInstruction, not in contents)
+        # (turns are written straight into Gemini's shape, no intermediate dicts)
+        messages = []
+        turns = PromptAssembler.iter_turns(
+            None,
+            self._select_history(
+                conversation_history, 10, self._reserved_tokens(message, dynamic_context)
+            ),
+            dynamic_context,
+            message.strip()
+        )
+        
+        # Note: Gemini API uses "model" for assistant responses, not "assistant"
+        for role, content in turns:
+            content = content.strip()
+            if content:  # Only add non-empty messages
+                # Convert "assistant" to "model" for Gemini API
+                gemini_role = "model" if role == "assistant" else "user"
+                messages.append({
+                    "role": gemini_role,
+                    "parts": [{"text": content}]
+                })
+        
+        # Validate we have at least one message
+        if not messages:
+            raise ValueError("No messages to send")
+        
+        # Prepare request payload; the (unchanging) system instruction goes first
+        payload = {}
+        if self._gemini_system_instruction is not None:
+            payload["systemInstruction"] = self._gemini_system_instruction
+        payload["contents"] = messages
+        payload["generationConfig"] = self._gemini_generation_config
+        
+        return payload
+    
+    def _gemini_url(self, method: str, query: str = "") -> str:
+        """Build a Gemini model endpoint URL (e.g. method="generateContent")."""
+        # Note: Gemini API expects model names like "gemini-pro" or "gemini-1.5-pro"
+        # Make sure model name is valid
+        url = self._gemini_url_template.format(method=method)
+        return f"{url}?{query}" if query else url
+    
+    def _gemini_error(self, e: httpx.HTTPStatusError) -> Exception:
+        """Log a Gemini HTTP error and build the exception raised to callers."""
+        error_detail = "Unknown error"
+        try:
+            error_response = orjson.loads(e.response.content)
+            if "error" in error_response:
+                error_detail = error_response["error"].get("message", str(error_response["error"]))
+            else:
+                error_detail = e.response.text
+        except:
+            error_detail = e.response.text
+        
+        logger.error("Gemini API error: %s - %s", e.response.status_code, error_detail)
+        logger.error("Attempted to use model: %s", self.model_name)
+        
+        # Provide helpful suggestions for common errors
+        if e.response.status_code == 404 and "not found" in error_detail.lower():
+            suggestion = (
+                f"\n❌ The model '{self.model_name}' is not available in API version v1beta.\n\n"
+                f"✅ Try using one of these available models:\n"
+                f"   - gemini-2.5-flash-lite (recommended - latest, fast, efficient)\n"
+                f"   - gemini-2.5-flash\n"
+                f"   - gemini-1.5-pro\n"
+                f"   - gemini-1.5-pro-latest\n\n"
+                f"📝 Update GOOGLE_ADK_MODEL_NAME in your .env file:\n"
+                f"   GOOGLE_ADK_MODEL_NAME=gemini-2.5-flash-lite\n\n"
+                f"Then restart your application."
+            )
+            error_detail += suggestion
+            logger.error(suggestion)
+        
+        return Exception(f"Gemini API error ({e.response.status_code}): {error_detail}")
+    
+    @staticmethod
+    def _gemini_text(result: Dict) -> Optional[str]:
+        """Extract the first candidate's text from a Gemini response (or stream chunk)."""
+        # One chain of lookups on the (normal) success path instead of a
+        # membership test and length check at every level
+        try:
+            return result["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError, TypeError):
+            return None
+    
+    async def _get_gemini_response(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
+    ) -> str:
+        """Get response from Google Gemini API."""
+        try:
+            content = orjson.dumps(self._build_gemini_payload(message, conversation_history, dynamic_context))
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                # Log request for debugging (without sensitive data)
+                logger.debug(
+                    "Gemini API request: URL=%s, model=%s, bytes=%d",
+                    self._gemini_generate_url, self.model_name, len(content)
+                )
             
-            # Add current user message
-            messages.append({
-                "role": "user",
-                "parts": [{"text": message.strip()}]
-            })
+            response = await self._post(self._gemini_generate_url, content, self._default_headers)
             
-            # Validate we have at least one message
-            if not messages:
-                raise ValueError("No messages to send")
+            if debug:
+                logger.debug("Gemini API response: status=%s", response.status_code)
             
-            # Prepare request payload
-            payload = {
-                "contents": messages,
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 1024,
-                }
-            }
+            result = await self._decode(response)
             
-            # Add system instruction if configured
-            if self.system_instruction and self.system_instruction.strip():
-                payload["systemInstruction"] = {
-                    "parts": [{"text": self.system_instruction.strip()}]
-                }
+            # Extract response text
+            text = self._gemini_text(result)
+            if text is not None:
+                return text
             
-            # Build Gemini API URL
-            # Note: Gemini API expects model names like "gemini-pro" or "gemini-1.5-pro"
-            # Make sure model name is valid
-            url = f"{self.api_url}/models/{self.model_name}:generateContent"
-            if self.api_key:
-                url += f"?key={self.api_key}"
+            raise ValueError("Could not parse Gemini response")
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                headers = {"Content-Type": "application/json"}
-                
-                # Log request for debugging (without sensitive data)
-                logger.debug(f"Gemini API request: URL={url.split('?')[0]}, model={self.model_name}, messages={len(messages)}")
-                
-                response = await client.post(url, json=payload, headers=headers)
-                
-                # Log response status
-                logger.debug(f"Gemini API response: status={response.status_code}")
-                
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract response text
-                if "candidates" in result and len(result["candidates"]) > 0:
-                    candidate = result["candidates"][0]
-                    if "content" in candidate and "parts" in candidate["content"]:
-                        parts = candidate["content"]["parts"]
-                        if len(parts) > 0 and "text" in parts[0]:
-                            return parts[0]["text"]
-                
-                raise ValueError("Could not parse Gemini response")
-                
         except httpx.HTTPStatusError as e:
-            error_detail = "Unknown error"
-            try:
-                error_response = e.response.json()
-                if "error" in error_response:
-                    error_detail = error_response["error"].get("message", str(error_response["error"]))
-                else:
-                    error_detail = e.response.text
-            except:
-                error_detail = e.response.text
-            
-            logger.error(f"Gemini API error: {e.response.status_code} - {error_detail}")
-            logger.error(f"Attempted to use model: {self.model_name}")
+            raise self._gemini_error(e)
+        except Exception as e:
+            logger.error("Error getting Gemini response: %s", e, exc_info=True)
+            raise
+    
+    async def _stream_gemini_response(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream response chunks from Google Gemini API (streamGenerateContent over SSE)."""
+        try:
+            payload = self._build_gemini_payload(message, conversation_history, dynamic_context)
+            url = self._gemini_stream_url
             
-            # Provide helpful suggestions for common errors
-            if e.response.status_code == 404 and "not found" in error_detail.lower():
-                suggestion = (
-                    f"\n❌ The model '{self.model_name}' is not available in API version v1beta.\n\n"
-                    f"✅ Try using one of these available models:\n"
-                    f"   - gemini-2.5-flash-lite (recommended - latest, fast, efficient)\n"
-                    f"   - gemini-2.5-flash\n"
-                    f"   - gemini-1.5-pro\n"
-                    f"   - gemini-1.5-pro-latest\n\n"
-                    f"📝 Update GOOGLE_ADK_MODEL_NAME in your .env file:\n"
-                    f"   GOOGLE_ADK_MODEL_NAME=gemini-2.5-flash-lite\n\n"
-                    f"Then restart your application."
-                )
-                error_detail += suggestion
-                logger.error(suggestion)
+            client = self._get_client()
+            headers = self._default_headers
+            async with client.stream("POST", url, content=orjson.dumps(payload), headers=headers) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    response.raise_for_status()
+                
+                async for data in _iter_sse_data(response):
+                    text = self._gemini_text(orjson.loads(data))
+                    if text:
+                        yield text
             
-            raise Exception(f"Gemini API error ({e.response.status_code}): {error_detail}")
+        except httpx.HTTPStatusError as e:
+            raise self._gemini_error(e)
         except Exception as e:
-            logger.error(f"Error getting Gemini response: {str(e)}", exc_info=True)
+            logger.error("Error streaming Gemini response: %s", e, exc_info=True)
             raise
     
+    def _build_openai_payload(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
+    ) -> Dict:
+        """Build the OpenAI-compatible chat/completions payload."""
+        conversation_history = conversation_history or []
+        
+        # Build messages array (OpenAI format): system, history, context, user
+        messages = PromptAssembler.build_messages(
+            self.system_instruction,
+            self._select_history(
+                conversation_history, 10, self._reserved_tokens(message, dynamic_context)
+            ),
+            dynamic_context,
+            message
+        )
+        
+        # Prepare request payload (OpenAI-compatible format)
+        return {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": 1024,
+        }
+    
     async def _get_openai_compatible_response(
         self,
         message: str,
-        conversation_history: Optional[List[Dict[str, str]]]
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
     ) -> str:
         """Get response from OpenAI-compatible API (Ollama, vLLM, Together AI, etc.)."""
         try:
-            conversation_history = conversation_history or []
+            content = orjson.dumps(self._build_openai_payload(message, conversation_history, dynamic_context))
             
-            # Build messages array (OpenAI format)
-            messages = []
+            response = await self._post(self._chat_url, content, self._default_headers)
+            result = await self._decode(response)
             
-            # Add system instruction if configured
-            if self.system_instruction:
-                messages.append({
-                    "role": "system",
-                    "content": self.system_instruction
-                })
+            # Extract response text (OpenAI format)
+            if "choices" in result and len(result["choices"]) > 0:
+                choice = result["choices"][0]
+                if "message" in choice and "content" in choice["message"]:
+                    return choice["message"]["content"]
             
-            # Add conversation history
-            for msg in conversation_history[-10:]:  # Limit to last 10 messages
-                messages.append({
-                    "role": msg.get("role", "user"),
-                    "content": msg.get("content", "")
-                })
+            raise ValueError("Could not parse OpenAI-compatible response")
             
-            # Add current user message
-            messages.append({
-                "role": "user",
-                "content": message
-            })
-            
-            # Prepare request payload (OpenAI-compatible format)
-            payload = {
-                "model": self.model_name,
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": 1024,
-            }
+        except httpx.HTTPStatusError as e:
+            logger.error("OpenAI-compatible API error: %s - %s", e.response.status_code, e.response.text)
+            raise Exception(f"API error: {e.response.status_code}")
+        except Exception as e:
+            logger.error("Error getting OpenAI-compatible response: %s", e, exc_info=True)
+            raise
+    
+    async def _stream_openai_compatible_response(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream response chunks from an OpenAI-compatible API ("stream": true over SSE)."""
+        try:
+            payload = self._build_openai_payload(message, conversation_history, dynamic_context)
+            payload["stream"] = True
             
-            # Build API URL
-            url = f"{self.api_url.rstrip('/')}/chat/completions"
+            url = self._chat_url
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                headers = {"Content-Type": "application/json"}
-                if self.api_key:
-                    headers["Authorization"] = f"Bearer {self.api_key}"
-                
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract response text (OpenAI format)
-                if "choices" in result and len(result["choices"]) > 0:
-                    choice = result["choices"][0]
-                    if "message" in choice and "content" in choice["message"]:
-                        return choice["message"]["content"]
-                
-                raise ValueError("Could not parse OpenAI-compatible response")
+            client = self._get_client()
+            async with client.stream("POST", url, content=orjson.dumps(payload), headers=self._default_headers) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    response.raise_for_status()
                 
+                async for data in _iter_sse_data(response):
+                    if data == "[DONE]":
+                        break
+                    choices = orjson.loads(data).get("choices") or []
+                    if choices:
+                        content = (choices[0].get("delta") or {}).get("content")
+                        if content:
+                            yield content
+            
         except httpx.HTTPStatusError as e:
-            logger.error(f"OpenAI-compatible API error: {e.response.status_code} - {e.response.text}")
+            logger.error("OpenAI-compatible API error: %s - %s", e.response.status_code, e.response.text)
             raise Exception(f"API error: {e.response.status_code}")
         except Exception as e:
-            logger.error(f"Error getting OpenAI-compatible response: {str(e)}", exc_info=True)
+            logger.error("Error streaming OpenAI-compatible response: %s", e, exc_info=True)
             raise
     
+    async def batch_openai_completions(
+        self,
+        prompts: List[str],
+        system: Optional[str] = None,
+        max_concurrency: int = 16
+    ) -> List[str]:
+        """
+        Complete many independent prompts in one request (offline evals, dataset scoring).
+        
+        Sends every prompt in a single /completions call ("prompt" as a list),
+        which vLLM and other OpenAI-compatible servers schedule as one batch
+        instead of N separate requests. Backends that reject list prompts (400)
+        are served one chat/completions request per prompt instead.
+        
+        Args:
+            prompts: Prompts to complete
+            system: Instruction prepended to every prompt (defaults to the client's
+                system instruction)
+            max_concurrency: Simultaneous requests in the per-prompt fallback
+            
+        Returns:
+            Completions in prompt order
+        """
+        if self.provider != "openai_compatible":
+            raise ValueError("batch_openai_completions requires the openai_compatible provider")
+        if not prompts:
+            return []
+        
+        system = system if system is not None else self.system_instruction
+        payload = {
+            "model": self.model_name,
+            "prompt": [f"{system}\n\n{prompt}" if system else prompt for prompt in prompts],
+            "temperature": self.temperature,
+            "max_tokens": 1024,
+        }
+        try:
+            response = await self._post(self._completions_url, payload, self._default_headers)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 400:
+                logger.error("OpenAI-compatible API error: %s - %s", e.response.status_code, e.response.text)
+                raise Exception(f"API error: {e.response.status_code}")
+            logger.info("Backend rejected batched prompts, completing %d prompts one by one", len(prompts))
+            return await self._complete_individually(prompts, system, max_concurrency)
+        
+        choices = (await self._decode(response)).get("choices") or []
+        if len(choices) != len(prompts):
+            raise ValueError(f"Expected {len(prompts)} completions, got {len(choices)}")
+        # Choices carry the index of their prompt but aren't guaranteed to be in order
+        choices.sort(key=lambda choice: choice.get("index", 0))
+        return [choice.get("text", "") for choice in choices]
+    
+    async def _complete_individually(
+        self,
+        prompts: List[str],
+        system: Optional[str],
+        max_concurrency: int
+    ) -> List[str]:
+        """Fallback for batch_openai_completions: one chat/completions call per prompt."""
+        semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        
+        async def complete(prompt: str) -> str:
+            messages = PromptAssembler.build_messages(system, (), None, prompt)
+            async with semaphore:
+                response = await self._post(self._chat_url, {
+                    "model": self.model_name,
+                    "messages": messages,
+                    "temperature": self.temperature,
+                    "max_tokens": 1024,
+                }, self._default_headers)
+            return (await self._decode(response))["choices"][0]["message"]["content"]
+        
+        return list(await asyncio.gather(*(complete(prompt) for prompt in prompts)))
+    
+    def _build_huggingface_payload(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
+    ) -> Dict:
+        """Build the Hugging Face text-generation payload."""
+        conversation_history = conversation_history or []
+        
+        turns = PromptAssembler.iter_turns(
+            None,
+            self._select_history(
+                conversation_history, 5, self._reserved_tokens(message, dynamic_context)
+            ),
+            dynamic_context,
+            message
+        )
+        
+        # Build conversation text from parts and join once (repeated += copies
+        # the whole prompt for every message)
+        parts: List[str] = []
+        if self.system_instruction:
+            parts.append(f"System: {self.system_instruction}\n\n")
+        
+        # Add conversation history, context and current user message
+        for role, content in turns:
+            label = _HF_ROLE_LABEL.get(role) or role.capitalize()
+            parts.append(f"{label}: {content}\n")
+        parts.append("Assistant:")
+        conversation_text = "".join(parts)
+        
+        # Prepare request payload
+        return {
+            "inputs": conversation_text,
+            "parameters": self._hf_parameters
+        }
+    
     async def _get_huggingface_response(
         self,
         message: str,
-        conversation_history: Optional[List[Dict[str, str]]]
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
     ) -> str:
         """Get response from Hugging Face Inference API."""
         try:
-            conversation_history = conversation_history or []
+            content = orjson.dumps(self._build_huggingface_payload(message, conversation_history, dynamic_context))
             
-            # Build conversation text
-            conversation_text = ""
-            if self.system_instruction:
-                conversation_text += f"System: {self.system_instruction}\n\n"
+            response = await self._post(self._hf_url, content, self._default_headers)
+            result = await self._decode(response)
             
-            # Add conversation history
-            for msg in conversation_history[-5:]:  # Limit to last 5 messages
-                role = msg.get("role", "user")
-                content = msg.get("content", "")
-                conversation_text += f"{role.capitalize()}: {content}\n"
+            # Extract response text (Hugging Face format)
+            if isinstance(result, list) and len(result) > 0:
+                if "generated_text" in result[0]:
+                    return result[0]["generated_text"].strip()
+                elif "text" in result[0]:
+                    return result[0]["text"].strip()
             
-            # Add current user message
-            conversation_text += f"User: {message}\nAssistant:"
+            # Fallback: try to extract from any text field
+            if isinstance(result, dict) and "generated_text" in result:
+                return result["generated_text"].strip()
             
-            # Prepare request payload
-            payload = {
-                "inputs": conversation_text,
-                "parameters": {
-                    "temperature": 0.7,
-                    "max_new_tokens": 1024,
-                    "return_full_text": False
-                }
-            }
+            raise ValueError("Could not parse Hugging Face response")
             
-            # Build API URL
-            url = f"{self.api_url.rstrip('/')}/models/{self.model_name}"
+        except httpx.HTTPStatusError as e:
+            logger.error("Hugging Face API error: %s - %s", e.response.status_code, e.response.text)
+            raise Exception(f"Hugging Face API error: {e.response.status_code}")
+        except Exception as e:
+            logger.error("Error getting Hugging Face response: %s", e, exc_info=True)
+            raise
+    
+    async def _stream_huggingface_response(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        dynamic_context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Stream tokens from a Hugging Face text-generation (TGI) endpoint ("stream": true over SSE)."""
+        try:
+            payload = self._build_huggingface_payload(message, conversation_history, dynamic_context)
+            payload["stream"] = True
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                headers = {"Content-Type": "application/json"}
-                if self.api_key:
-                    headers["Authorization"] = f"Bearer {self.api_key}"
-                
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract response text (Hugging Face format)
-                if isinstance(result, list) and len(result) > 0:
-                    if "generated_text" in result[0]:
-                        return result[0]["generated_text"].strip()
-                    elif "text" in result[0]:
-                        return result[0]["text"].strip()
-                
-                # Fallback: try to extract from any text field
-                if isinstance(result, dict) and "generated_text" in result:
-                    return result["generated_text"].strip()
+            url = self._hf_url
+            
+            client = self._get_client()
+            async with client.stream("POST", url, content=orjson.dumps(payload), headers=self._default_headers) as response:
+                if response.status_code >= 400:
+                    await response.aread()
+                    response.raise_for_status()
                 
-                raise ValueError("Could not parse Hugging Face response")
+                leading = True
+                async for data in _iter_sse_data(response):
+                    token = orjson.loads(data).get("token") or {}
+                    text = token.get("text")
+                    if not text or token.get("special"):
+                        continue
+                    # Match the buffered response, which is stripped
+                    if leading:
+                        text = text.lstrip()
+                        leading = not text
+                    if text:
+                        yield text
                 
         except httpx.HTTPStatusError as e:
-            logger.error(f"Hugging Face API error: {e.response.status_code} - {e.response.text}")
+            logger.error("Hugging Face API error: %s - %s", e.response.status_code, e.response.text)
             raise Exception(f"Hugging Face API error: {e.response.status_code}")
         except Exception as e:
-            logger.error(f"Error getting Hugging Face response: {str(e)}", exc_info=True)
+            logger.error("Error streaming Hugging Face response: %s", e, exc_info=True)
             raise
 
 
+async def _iter_sse_data(response: httpx.Response) -> AsyncIterator[str]:
+    """Yield the payload of each `data:` line from a Server-Sent Events response."""
+    async for line in response.aiter_lines():
+        if line.startswith("data:"):
+            yield line[5:].strip()
+
+
 # Backward compatibility alias
 GoogleADKClient = LLMClient
@@ -0,0 +1,66 @@
+"""
+Prompt assembly with a byte-stable prefix for provider-side prompt caching.
+"""
+
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+
+
+class PromptAssembler:
+    """
+    Builds provider-neutral message lists in cache-friendly order.
+
+    Gemini and OpenAI-compatible backends cache the longest previously seen
+    prompt prefix, so anything that changes every turn must come after the
+    parts that don't:
+
+        [static_system, committed_history, dynamic_context, user_msg]
+    """
+
+    @staticmethod
+    def iter_turns(
+        static_system: Optional[str],
+        committed_history: Iterable[Dict[str, str]],
+        dynamic_context: Optional[str],
+        user_msg: str
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (role, content) pairs in prompt order without building message dicts.
+
+        Lets provider payload builders write their own message shape directly
+        instead of converting an intermediate list (see build_messages).
+        """
+        if static_system:
+            yield "system", static_system
+        for msg in committed_history:
+            yield msg.get("role", "user"), msg.get("content", "")
+        if dynamic_context:
+            yield "user", dynamic_context
+        yield "user", user_msg
+
+    @staticmethod
+    def build_messages(
+        static_system: Optional[str],
+        committed_history: Iterable[Dict[str, str]],
+        dynamic_context: Optional[str],
+        user_msg: str
+    ) -> List[Dict[str, str]]:
+        """
+        Assemble messages for one LLM call.
+
+        Args:
+            static_system: System instruction (identical on every call)
+            committed_history: Earlier conversation messages, oldest first
+            dynamic_context: Per-turn context (retrieved memory, etc.), if any
+            user_msg: The new user message
+
+        Returns:
+            List of {"role", "content"} messages; only role and content are copied
+            from history so per-message metadata such as timestamps never leaks
+            into the prompt and breaks the cached prefix
+        """
+        return [
+            {"role": role, "content": content}
+            for role, content in PromptAssembler.iter_turns(
+                static_system, committed_history, dynamic_context, user_msg
+            )
+        ]
@@ -0,0 +1,87 @@
+"""
+Outbound rate limiting, retry-delay and response-status helpers for API clients.
+"""
+
+import asyncio
+import random
+import time
+from typing import Optional
+
+import httpx
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`; each
+    request takes one, waiting until one is available. Waiters are served in
+    arrival order. Usable as `async with bucket:` or `await bucket.acquire()`.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialize token bucket.
+
+        Args:
+            rate: Sustained requests per second
+            capacity: Maximum burst size (defaults to one second's worth, at least 1)
+        """
+        self.rate = rate
+        self.capacity = max(capacity if capacity is not None else rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse a Retry-After header given in seconds (HTTP-date values are ignored)."""
+    try:
+        return max(float(response.headers["Retry-After"]), 0.0)
+    except (KeyError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff (base * 2^attempt, capped) with +/-30% jitter."""
+    return min(cap, base * 2 ** attempt) * (0.7 + 0.6 * random.random())
+
+
+def retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Delay before retrying a rate-limited request: Retry-After if given, else backoff."""
+    retry_after = retry_after_seconds(response)
+    return retry_after if retry_after is not None else backoff_delay(attempt)
+
+
+def check_status(response: httpx.Response):
+    """
+    Raise httpx.HTTPStatusError for 4xx/5xx responses.
+
+    A single integer comparison on the success path; unlike
+    Response.raise_for_status() nothing else is inspected unless it failed.
+    """
+    if response.status_code >= 400:
+        raise httpx.HTTPStatusError(
+            f"HTTP {response.status_code} for url {response.request.url}",
+            request=response.request,
+            response=response
+        )
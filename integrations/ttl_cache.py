@@ -0,0 +1,66 @@
+"""
+Small in-process cache with LRU eviction and a per-entry time-to-live.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    LRU cache whose entries expire ttl seconds after they were stored.
+
+    Every operation is synchronous, so on a single event loop no lock is
+    needed: nothing can interleave between a lookup and an update.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        """
+        Initialize cache.
+
+        Args:
+            maxsize: Maximum number of entries (least recently used are evicted)
+            ttl: Seconds an entry stays valid after it was stored
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (expiry on the monotonic clock, value), ordered by recency
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a value.
+
+        Returns:
+            Cached value, or None if missing or expired
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries beyond maxsize."""
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        """Remove an entry, if present."""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove all entries."""
+        self._entries.clear()
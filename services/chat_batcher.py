@@ -0,0 +1,142 @@
+"""
+Micro-batcher that groups concurrent chat requests into a single LLM round.
+"""
+
+import asyncio
+import logging
+from typing import List, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ChatBatcher:
+    """Collects chat messages arriving within a short window and dispatches them together."""
+
+    def __init__(self, llm_client, max_batch: int = 8, max_wait_ms: float = 0.0):
+        """
+        Initialize chat batcher.
+
+        Args:
+            llm_client: LLMClient used to answer the batched messages
+            max_batch: Maximum number of messages dispatched in one batch
+            max_wait_ms: Maximum time to hold a batch open waiting for more messages;
+                0 (the default) only takes messages already queued, since
+                get_responses_batch sends each message as its own request and
+                waiting gains nothing until the provider has a batch endpoint
+        """
+        self.llm_client = llm_client
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+
+    def start(self):
+        """Start the background worker that drains the queue."""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+            logger.info(f"ChatBatcher started - max_batch: {self.max_batch}, max_wait: {self.max_wait * 1000:.0f}ms")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """
+        Stop the worker, finish in-flight batches and fail messages still queued.
+
+        Call before closing the LLM client: batches already sent are given up
+        to drain_timeout seconds to complete, then cancelled (their callers get
+        an error), so nothing uses the client after this returns.
+
+        Args:
+            drain_timeout: Seconds to wait for in-flight batches
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._in_flight:
+            _, pending = await asyncio.wait(set(self._in_flight), timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Chat batcher stopped"))
+
+    async def submit(
+        self,
+        message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """
+        Queue a message and wait for its response.
+
+        Args:
+            message: User's message/query
+            conversation_history: Previous conversation messages for context
+
+        Returns:
+            AI-generated response string
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, conversation_history, future))
+        return await future
+
+    async def _run(self):
+        """Collect batches from the queue and dispatch them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+
+            # Adaptive window: only hold the batch open while other batches are
+            # in flight, so an idle server answers a lone message immediately.
+            deadline = loop.time() + (self.max_wait if self._in_flight else 0.0)
+            try:
+                while len(batch) < self.max_batch:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Stopped while collecting: these messages were already taken off the queue
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Chat batcher stopped"))
+                raise
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, Optional[List[Dict[str, str]]], asyncio.Future]]):
+        """Send one batch to the LLM and resolve each waiting request."""
+        logger.debug(f"Dispatching chat batch of {len(batch)} message(s)")
+        try:
+            results = await self.llm_client.get_responses_batch(
+                [(message, history) for message, history, _ in batch]
+            )
+        except asyncio.CancelledError:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Chat batcher stopped"))
+            raise
+        except Exception as e:
+            results = [e] * len(batch)
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue  # Caller went away (e.g. client disconnected)
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
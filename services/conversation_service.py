@@ -2,21 +2,342 @@
 Service for managing conversation history and sessions.
 """
 
+import asyncio
 import uuid
+import hashlib
 import logging
-from typing import List, Dict, Optional
-from datetime import datetime
+import pathlib
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import Any, Awaitable, Callable, Collection, Deque, Iterable, Iterator, List, Dict, Optional, Sequence, Tuple, Union
+from datetime import datetime, timezone
+
+import orjson
+
+from integrations.ttl_cache import TTLCache
+from services.session_backends import Backend, InMemoryBackend
 
 logger = logging.getLogger(__name__)
 
+Summarizer = Callable[[Sequence[Dict[str, str]]], Awaitable[str]]
+# (summary so far, message leaving the recent window) -> new summary
+RollingSummarizer = Callable[[str, "Message"], str]
+# Internal session key: 16 UUID bytes, or the ID itself if it isn't a UUID
+SessionKey = Union[str, bytes]
+
+# Number of session lock stripes (a power of two)
+LOCK_STRIPES = 64
+
+# Canonical role strings. Roles arriving from requests or a backend are fresh
+# string objects; interning them makes every stored role share one object, so
+# the roles column holds shared pointers and role comparisons hit the identity
+# fast path.
+_ROLES = {role: sys.intern(role) for role in ("user", "assistant", "system")}
+
+# Number of unreferenced sessions the clock sweep weighs for each eviction
+EVICTION_SAMPLE = 8
+
+# Seconds a session's history summary stays cached in memory
+SUMMARY_CACHE_TTL = 24 * 3600
+
+# Upper bound for the default rolling summary (~1000 tokens)
+ROLLING_SUMMARY_MAX_CHARS = 4000
+
+@dataclass(slots=True)
+class Message:
+    """
+    One conversation message, as read from a SessionLog.
+    
+    A slotted object takes roughly a third of the memory of the equivalent
+    dict. It also answers get() and [] like the dicts it replaced, so history
+    consumers work unchanged and can't tell it from the plain dicts returned
+    by the Redis-backed store; as_dict() converts at API boundaries.
+    """
+    role: str
+    content: str
+    ts: int = 0  # time.time_ns() when stored; 0 for synthetic messages
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+    
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+    
+    def as_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content, "ts": self.ts}
+
+
+class SessionLog:
+    """
+    One session's messages stored as parallel columns (struct of arrays).
+    
+    Roles and contents are lists and timestamps an array('q') of 8-byte ints
+    (instead of an int object per message), so a scan over one field, such as
+    finding the last N user messages, walks one dense column rather than
+    every field of every message. Message objects are only built when history
+    is read. With maxlen set the columns are a ring buffer: once full, each
+    append overwrites the oldest slot.
+    
+    Iterating doesn't copy anything. Like a deque, it raises RuntimeError if
+    messages are overwritten or cleared meanwhile; appends to a log that isn't
+    full just aren't seen.
+    """
+    
+    __slots__ = ("roles", "contents", "ts", "maxlen", "_start", "_version")
+    
+    def __init__(self, maxlen: Optional[int] = None):
+        self.roles: List[str] = []
+        self.contents: List[str] = []
+        self.ts = array("q")
+        self.maxlen = maxlen
+        # Physical index of the oldest message once the ring has wrapped
+        self._start = 0
+        # Bumped before and after every in-place change (odd while one is underway)
+        self._version = 0
+    
+    def __len__(self) -> int:
+        return len(self.roles)
+    
+    def _indices(self) -> Iterator[int]:
+        """Physical column indices, oldest message first."""
+        return chain(range(self._start, len(self.roles)), range(self._start))
+    
+    def _indices_newest_first(self) -> Iterator[int]:
+        return chain(range(self._start - 1, -1, -1), range(len(self.roles) - 1, self._start - 1, -1))
+    
+    def append(self, role: str, content: str, ts: int) -> Optional[Message]:
+        """
+        Add a message.
+        
+        Returns:
+            The oldest message if a full log had to drop it, else None
+        """
+        if self.maxlen is None or len(self.roles) < self.maxlen:
+            self.roles.append(role)
+            self.contents.append(content)
+            self.ts.append(ts)
+            return None
+        if self.maxlen <= 0:
+            return Message(role, content, ts)
+        i = self._start
+        evicted = Message(self.roles[i], self.contents[i], self.ts[i])
+        self._version += 1
+        self.roles[i] = role
+        self.contents[i] = content
+        self.ts[i] = ts
+        self._start = (i + 1) % self.maxlen
+        self._version += 1
+        return evicted
+    
+    def clear(self):
+        """Remove all messages."""
+        self._version += 1
+        self.roles.clear()
+        self.contents.clear()
+        del self.ts[:]
+        self._start = 0
+        self._version += 1
+    
+    def __iter__(self) -> Iterator[Message]:
+        roles, contents, ts = self.roles, self.contents, self.ts
+        version = self._version
+        for i in self._indices():
+            try:
+                message = Message(roles[i], contents[i], ts[i])
+            except IndexError:
+                message = None
+            if message is None or self._version != version or version & 1:
+                raise RuntimeError("session messages changed during iteration")
+            yield message
+    
+    def tail(self, n: int) -> List[Message]:
+        """The last n messages, oldest first."""
+        roles, contents, ts = self.roles, self.contents, self.ts
+        indices = list(islice(self._indices_newest_first(), max(n, 0)))
+        return [Message(roles[i], contents[i], ts[i]) for i in reversed(indices)]
+    
+    def recent_contents(self, role: str, n: int) -> List[str]:
+        """
+        Contents of the last n messages with the given role, oldest first.
+        
+        Only the roles column is scanned; contents are read on matches.
+        """
+        roles, contents = self.roles, self.contents
+        found: List[str] = []
+        if n > 0:
+            for i in self._indices_newest_first():
+                if roles[i] == role:
+                    found.append(contents[i])
+                    if len(found) == n:
+                        break
+        found.reverse()
+        return found
+
+
+def _session_key(session_id: SessionKey) -> SessionKey:
+    """
+    Internal key for a session ID.
+    
+    UUIDs (what create_session hands out) are stored as their 16 raw bytes:
+    about half the memory of the 36-character string and a shorter buffer to
+    hash on every lookup. Other client-supplied IDs are kept as they are.
+    """
+    if isinstance(session_id, bytes):
+        return session_id
+    try:
+        return uuid.UUID(session_id).bytes
+    except ValueError:
+        return session_id
+
+
+def _session_id(key: SessionKey) -> str:
+    """Public (string) session ID for an internal key."""
+    return str(uuid.UUID(bytes=key)) if isinstance(key, bytes) else key
+
+
+def _summary_owner(session_id: str) -> str:
+    """
+    Name a session's history summary is cached under.
+    
+    A hash rather than the session ID itself, so summary files on disk don't
+    reveal session IDs.
+    """
+    return hashlib.blake2b(session_id.encode(), digest_size=16).hexdigest()
+
+
+def estimate_tokens(messages: Sequence[Dict[str, str]]) -> int:
+    """Rough token count for a list of messages (~4 characters per token)."""
+    return sum(len(msg.get("content", "")) for msg in messages) // 4
+
+
+def format_timestamp(message: Dict) -> str:
+    """
+    ISO 8601 (UTC) timestamp of a stored message, or "" if it has none.
+    
+    Messages store time.time_ns() under "ts" and are only formatted when a
+    caller needs text (API responses, exports); messages written before that
+    change carry a preformatted "timestamp" string, returned as-is.
+    """
+    ts = message.get("ts")
+    if not ts:
+        return message.get("timestamp", "")
+    return datetime.fromtimestamp(ts / 1e9, tz=timezone.utc).isoformat()
+
+
+def _rolling_summary_message(summary: str) -> Message:
+    """System message that puts a session's rolling summary in front of its history."""
+    return Message("system", f"Earlier in this conversation:\n{summary}")
+
+
+def append_to_summary(summary: str, message: Message) -> str:
+    """
+    Default rolling summarizer: keep a transcript of evicted messages.
+    
+    Appends a "Role: content" line and drops the oldest lines beyond
+    ROLLING_SUMMARY_MAX_CHARS. No model call, so it is safe on the write path;
+    LLM summaries of long histories come from get_compacted_history.
+    """
+    line = f"{message.role.capitalize()}: {message.content}"
+    summary = f"{summary}\n{line}" if summary else line
+    if len(summary) > ROLLING_SUMMARY_MAX_CHARS:
+        summary = summary[-ROLLING_SUMMARY_MAX_CHARS:]
+        newline = summary.find("\n")
+        if newline != -1:
+            summary = summary[newline + 1:]
+    return summary
+
 
 class ConversationService:
-    """Service for managing conversation sessions and history."""
+    """
+    Service for managing conversation sessions and history.
     
-    def __init__(self):
-        """Initialize conversation service with in-memory storage."""
-        # In-memory storage: {session_id: [messages]}
-        self.sessions: Dict[str, List[Dict[str, str]]] = {}
+    Memory is bounded: each session keeps at most max_messages_per_session
+    recent messages plus a rolling summary that the oldest message is folded
+    into when it leaves the window, and beyond max_sessions a cold session is
+    evicted from memory. Messages are written through to a backend (see
+    session_backends), which evicted sessions are loaded back from when used
+    again; with the default InMemoryBackend they are simply gone. Session
+    listings and counts cover the sessions held in memory.
+    
+    Safe to share between threads without a global lock: each session is
+    guarded by one of LOCK_STRIPES striped locks, so writers on different
+    sessions don't contend, and the shared session index is only locked to
+    insert and evict sessions. Lookups don't lock or reorder it: a use just
+    sets the session's reference bit, which the eviction sweep reads (CLOCK).
+    Locks are always taken stripe first, then index, and a thread never holds
+    two stripe locks: evicted sessions are released under their own stripe
+    lock after the evicting thread has let go of its own.
+    """
+    
+    def __init__(
+        self,
+        summary_cache_dir: Optional[str] = None,
+        max_messages_per_session: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+        rolling_summarizer: Optional[RollingSummarizer] = None,
+        backend: Optional[Backend] = None,
+        recent_window: int = 6,
+        summary_cache_size: int = 1024
+    ):
+        """
+        Initialize conversation service with in-memory storage.
+        
+        Args:
+            summary_cache_dir: Directory where history summaries are cached
+                on disk (memory only when not set)
+            max_messages_per_session: Messages kept per session (unbounded when not set)
+            max_sessions: Sessions kept in memory (unbounded when not set)
+            rolling_summarizer: Folds a message leaving a full session into that
+                session's summary (defaults to append_to_summary)
+            backend: Persistent store for sessions (defaults to InMemoryBackend)
+            recent_window: Number of recent messages per session kept ready
+                for get_recent (0 to keep none)
+            summary_cache_size: Sessions whose latest history summary is kept
+                in memory
+        """
+        self.max_messages_per_session = max_messages_per_session
+        self.max_sessions = max_sessions
+        # In-memory storage: {session key: SessionLog}, in clock order
+        # (keys from _session_key; get_all_sessions() returns string IDs)
+        self.sessions: "OrderedDict[SessionKey, SessionLog]" = OrderedDict()
+        # CLOCK reference bits: 1 if a session was used since the sweep last passed it
+        self._ref_bits: Dict[SessionKey, int] = {}
+        # Sessions removed from the index but not yet released (see _reap_evictions)
+        self._evicted: Deque[Tuple[SessionKey, SessionLog]] = deque()
+        # Rolling summary of each session's messages that no longer fit its window
+        self._rolling_summaries: Dict[SessionKey, str] = {}
+        self.rolling_summarizer = rolling_summarizer or append_to_summary
+        self.backend = backend or InMemoryBackend()
+        # Last _window_n messages of each session, as returned by get_recent;
+        # no window is cached when _window_n is 0 (including sessions kept empty)
+        self._window_n = max(recent_window, 0)
+        if max_messages_per_session is not None:
+            self._window_n = max(min(recent_window, max_messages_per_session), 0)
+        self._window_cache: Dict[SessionKey, Tuple[Message, ...]] = {}
+        self._sessions_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        # Running message counts so admin stats don't have to scan every session;
+        # one set per stripe, updated under that stripe's lock and summed on read
+        self._stripe_counts: List[Dict[str, int]] = [
+            {"user": 0, "assistant": 0, "total": 0} for _ in range(LOCK_STRIPES)
+        ]
+        # Anonymized session IDs, computed once per session for repeated exports
+        self._anonymized_ids: Dict[str, str] = {}
+        # Latest history summary of each session, by _summary_owner(session ID):
+        # (sha256(model + summarized messages), messages covered, summary). Touched from the event
+        # loop and from threadpool threads (clear_session), hence the lock
+        self._summaries = TTLCache(summary_cache_size, SUMMARY_CACHE_TTL)
+        self._summaries_lock = threading.Lock()
+        self.summary_cache_dir = pathlib.Path(summary_cache_dir) if summary_cache_dir else None
+        self._append = self._make_append()
         
     def create_session(self) -> str:
         """
@@ -25,11 +346,175 @@ class ConversationService:
         Returns:
             New session ID (UUID)
         """
-        session_id = str(uuid.uuid4())
-        self.sessions[session_id] = []
-        logger.info(f"Created new conversation session: {session_id}")
+        new_id = uuid.uuid4()
+        session_id, key = str(new_id), new_id.bytes
+        stripe = self._stripe(key)
+        with self._stripes[stripe]:
+            self._new_session(key)
+        if self._evicted:
+            self._reap_evictions()
+        logger.info("Created new conversation session: %s", session_id)
         return session_id
     
+    def _stripe(self, key: SessionKey) -> int:
+        """Index of the lock stripe guarding a session."""
+        return hash(key) & (LOCK_STRIPES - 1)
+    
+    def _touch(self, key: SessionKey) -> Optional[SessionLog]:
+        """
+        Look up a session and mark it as used.
+        
+        Lock-free: a single dict read and, on a hit, a single dict write of the
+        reference bit, both atomic.
+        """
+        messages = self.sessions.get(key)
+        if messages is not None:
+            self._ref_bits[key] = 1
+        return messages
+    
+    def _new_session(self, key: SessionKey) -> SessionLog:
+        """
+        Store an empty session, evicting cold sessions beyond max_sessions.
+        
+        Must be called holding the session's stripe lock. Evicted sessions
+        only leave the index here; the caller releases them with
+        _reap_evictions once it has released its stripe lock.
+        """
+        messages = SessionLog(self.max_messages_per_session)
+        with self._sessions_lock:
+            self.sessions[key] = messages
+            # Referenced, so the sweep for its own insertion passes over it
+            self._ref_bits[key] = 1
+            if self.max_sessions is not None:
+                while len(self.sessions) > self.max_sessions:
+                    self._evicted.append(self._pop_eviction_victim())
+        return messages
+    
+    def _reap_evictions(self):
+        """
+        Release sessions evicted from the index, each under its own stripe lock.
+        
+        Must be called holding no stripe lock. A writer that looked the
+        session up before it was evicted finishes first, so its messages are
+        uncounted too. If the session was loaded back in the meantime, its
+        summary and window belong to the new copy and are kept.
+        """
+        evicted = self._evicted
+        while True:
+            try:
+                key, messages = evicted.popleft()
+            except IndexError:
+                return
+            stripe = self._stripe(key)
+            with self._stripes[stripe]:
+                self._release_all(messages, self._stripe_counts[stripe])
+                if key not in self.sessions:
+                    self._anonymized_ids.pop(_session_id(key), None)
+                    self._rolling_summaries.pop(key, None)
+                    self._window_cache.pop(key, None)
+                    self._ref_bits.pop(key, None)
+            logger.info("Evicted session %s from memory", _session_id(key))
+    
+    def _pop_eviction_victim(self) -> Tuple[SessionKey, SessionLog]:
+        """
+        Remove the session to evict from the index (caller holds the index lock).
+        
+        CLOCK with a size-weighted pick: the sweep takes sessions from the
+        front of the index, sending referenced ones to the back with their
+        bit cleared (a second chance) until EVICTION_SAMPLE unreferenced ones
+        are found or it has gone round once; if every session was referenced,
+        the front one (now unreferenced) is the only candidate. Of those, the one with the highest message count times
+        coldness goes, so a large idle session frees more memory than a small
+        one barely older. The rest go back to the front in their order.
+        """
+        sessions, ref_bits = self.sessions, self._ref_bits
+        candidates: List[Tuple[SessionKey, SessionLog]] = []
+        for _ in range(len(sessions)):
+            key, messages = sessions.popitem(last=False)
+            if ref_bits.pop(key, 0):
+                sessions[key] = messages
+            else:
+                candidates.append((key, messages))
+                if len(candidates) == EVICTION_SAMPLE:
+                    break
+        if not candidates:
+            candidates.append(sessions.popitem(last=False))
+        # max() keeps the first (coldest) candidate on ties, e.g. all empty
+        victim = max(
+            range(len(candidates)),
+            key=lambda rank: len(candidates[rank][1]) * (EVICTION_SAMPLE - rank)
+        )
+        for key, messages in reversed(candidates[:victim] + candidates[victim + 1:]):
+            sessions[key] = messages
+            sessions.move_to_end(key, last=False)
+        return candidates[victim]
+    
+    def _lookup(self, key: SessionKey, stripe: int, create: bool = False) -> Optional[SessionLog]:
+        """
+        Find a session in memory or, failing that, load it from the backend.
+        
+        Must be called holding the session's stripe lock.
+        
+        Args:
+            key: Session key
+            stripe: The session's lock stripe
+            create: Store an empty session if there is none anywhere
+            
+        Returns:
+            The session, or None if it doesn't exist and create is False
+        """
+        messages = self._touch(key)
+        if messages is None:
+            stored = self.backend.load(_session_id(key))
+            if stored or create:
+                counts = self._stripe_counts[stripe]
+                messages = self._new_session(key)
+                # Left over from an evicted copy not yet reaped
+                self._rolling_summaries.pop(key, None)
+                self._window_cache.pop(key, None)
+                # Replaying rebuilds the rolling summary of messages beyond the window
+                for role, content, ts in stored:
+                    self._append(key, messages, counts, role, content, ts)
+        return messages
+    
+    def _make_append(self) -> Callable[[SessionKey, SessionLog, Dict[str, int], str, str, int], None]:
+        """
+        Build the per-message append step, specialized for this service.
+        
+        Everything the step touches (the window cache and size, the summary
+        store, the summarizer, the role table) is bound into the closure once,
+        so each message costs local and cell reads rather than attribute,
+        method and global lookups. The rolling summarizer is captured here;
+        it is fixed at construction.
+        """
+        roles, intern, make_message = _ROLES, sys.intern, Message
+        window_cache, window_n = self._window_cache, self._window_n
+        summaries, summarize = self._rolling_summaries, self.rolling_summarizer
+        count = self._count
+        
+        def append(
+            key: SessionKey,
+            messages: SessionLog,
+            counts: Dict[str, int],
+            role: str,
+            content: str,
+            ts: int
+        ):
+            """Append to a session held in memory (caller holds its stripe lock)."""
+            role = roles.get(role) or intern(role)
+            oldest = messages.append(role, content, ts)
+            # Only present when window_n > 0 (a [-0:] slice would keep everything)
+            window = window_cache.get(key)
+            if window is not None:
+                window_cache[key] = (window + (make_message(role, content, ts),))[-window_n:]
+            count(counts, role, 1)
+            if oldest is not None:
+                # The oldest message left a full session; keep its gist
+                count(counts, oldest.role, -1)
+                summaries[key] = summarize(summaries.get(key, ""), oldest)
+        
+        return append
+    
     def add_message(self, session_id: str, role: str, content: str):
         """
         Add a message to a conversation session.
@@ -39,19 +524,51 @@ class ConversationService:
             role: Message role ("user" or "assistant")
             content: Message content
         """
-        if session_id not in self.sessions:
-            self.sessions[session_id] = []
+        key = _session_key(session_id)
+        stripe = self._stripe(key)
+        counts = self._stripe_counts[stripe]
+        with self._stripes[stripe]:
+            messages = self._lookup(key, stripe, create=True)
+            # Timestamps are formatted lazily, see format_timestamp
+            ts = time.time_ns()
+            self.backend.append(_session_id(key), role, content, ts)
+            self._append(key, messages, counts, role, content, ts)
+        if self._evicted:
+            self._reap_evictions()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Added %s message to session %s", role, session_id)
+    
+    def add_messages(self, session_id: str, messages: Iterable[Tuple[str, str]]):
+        """
+        Add several messages to a conversation session at once.
         
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        }
+        Equivalent to calling add_message for each message, but the session
+        is looked up, locked and written to the backend once for the whole
+        batch, which makes replaying or importing a history much cheaper.
+        All messages share one timestamp.
         
-        self.sessions[session_id].append(message)
-        logger.debug(f"Added {role} message to session {session_id}")
+        Args:
+            session_id: Session identifier
+            messages: (role, content) pairs, oldest first
+        """
+        ts = time.time_ns()
+        batch = [(role, content, ts) for role, content in messages]
+        if not batch:
+            return
+        key = _session_key(session_id)
+        stripe = self._stripe(key)
+        counts = self._stripe_counts[stripe]
+        with self._stripes[stripe]:
+            log = self._lookup(key, stripe, create=True)
+            self.backend.extend(_session_id(key), batch)
+            for role, content, ts in batch:
+                self._append(key, log, counts, role, content, ts)
+        if self._evicted:
+            self._reap_evictions()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Added %d messages to session %s", len(batch), session_id)
     
-    def get_session_history(self, session_id: str) -> List[Dict[str, str]]:
+    def get_session_history(self, session_id: str) -> Tuple[Dict[str, str], ...]:
         """
         Get conversation history for a session.
         
@@ -59,13 +576,275 @@ class ConversationService:
             session_id: Session identifier
             
         Returns:
-            List of messages in the conversation
+            Immutable snapshot (tuple) of the messages in the conversation; once
+            older messages have left the window, a system message with their
+            rolling summary comes first
+        """
+        summary, history = self._summary_and_history(session_id)
+        if summary:
+            return (_rolling_summary_message(summary),) + history
+        return history
+    
+    def _summary_and_history(self, session_id: str) -> Tuple[str, Tuple[Dict[str, str], ...]]:
         """
-        if session_id not in self.sessions:
-            logger.warning(f"Session {session_id} not found, returning empty history")
-            return []
+        Get a session's rolling summary ("" if none) and its messages, separately.
         
-        return self.sessions[session_id].copy()
+        Stores that keep no rolling summary (see RedisConversationService)
+        return "" and their full history.
+        """
+        key = _session_key(session_id)
+        stripe = self._stripe(key)
+        # Columns are appended one by one, so reading them takes the stripe lock
+        with self._stripes[stripe]:
+            messages = self._lookup(key, stripe)
+            if messages is not None:
+                history = tuple(messages)
+                summary = self._rolling_summaries.get(key, "")
+        if self._evicted:
+            self._reap_evictions()
+        if messages is None:
+            logger.warning("Session %s not found, returning empty history", session_id)
+            return "", ()
+        return summary, history
+    
+    def iter_session_history(self, session_id: str) -> Iterator[Dict[str, str]]:
+        """
+        Iterate over a session's history without copying it.
+        
+        Yields the same messages as get_session_history (rolling summary
+        first) for read-only consumers that don't need a snapshot. Raises
+        RuntimeError if the session overflows or is cleared while iterating;
+        take a snapshot with get_session_history when that can happen.
+        
+        Args:
+            session_id: Session identifier
+            
+        Yields:
+            Messages, oldest first
+        """
+        key = _session_key(session_id)
+        stripe = self._stripe(key)
+        with self._stripes[stripe]:
+            messages = self._lookup(key, stripe)
+        if self._evicted:
+            self._reap_evictions()
+        if messages is None:
+            # Other stores (see RedisConversationService) only expose full history
+            yield from self.get_session_history(session_id)
+            return
+        summary = self._rolling_summaries.get(key)
+        if summary:
+            yield _rolling_summary_message(summary)
+        yield from messages
+    
+    def get_recent(self, session_id: str, n: int = 6) -> Tuple[Dict[str, str], ...]:
+        """
+        Get a session's last n messages (without the rolling summary).
+        
+        The last recent_window messages of each session are kept as a
+        ready-made tuple, extended on every add_message, so the common
+        "last few turns" read returns it as-is instead of rebuilding it from
+        the session's columns. Other values of n are read from the session.
+        
+        Args:
+            session_id: Session identifier
+            n: Number of most recent messages
+            
+        Returns:
+            Immutable snapshot (tuple) of up to n messages, oldest first
+        """
+        if n <= 0:
+            return ()
+        key = _session_key(session_id)
+        if n == self._window_n:
+            window = self._window_cache.get(key)
+            if window is not None:
+                self._touch(key)
+                return window
+        stripe = self._stripe(key)
+        with self._stripes[stripe]:
+            messages = self._lookup(key, stripe)
+            if messages is not None:
+                recent = tuple(messages.tail(n))
+                if n == self._window_n:
+                    self._window_cache[key] = recent
+        if self._evicted:
+            self._reap_evictions()
+        if messages is not None:
+            return recent
+        # Other stores (see RedisConversationService) only expose full history
+        return self.get_session_history(session_id)[-n:]
+    
+    def get_memory(self, session_id: str, last_n: int = 6) -> Dict:
+        """
+        Get a session's memory in the shape of Zep's Memory API.
+        
+        Args:
+            session_id: Session identifier
+            last_n: Number of most recent messages to include
+            
+        Returns:
+            {"facts": [], "summary": str, "messages": [...]}; facts are not
+            extracted by this service and always empty
+        """
+        recent = self.get_recent(session_id, last_n)
+        return {
+            "facts": [],
+            "summary": self._rolling_summaries.get(_session_key(session_id), ""),
+            "messages": list(recent)
+        }
+    
+    async def get_compacted_history(
+        self,
+        session_id: str,
+        summarizer: Summarizer,
+        model_id: str = "",
+        max_tokens: int = 4000,
+        keep_recent: int = 6
+    ) -> Tuple[Dict[str, str], ...]:
+        """
+        Get conversation history bounded to roughly max_tokens.
+        
+        Short histories are returned as-is. Longer ones keep their recent
+        messages verbatim and replace everything before them with a single
+        system message summarizing it. The summarized boundary only moves in
+        steps of keep_recent messages, so the same summary (and the same
+        prompt prefix) is reused for several turns, and each summary is cached
+        by a hash of the messages it covers so it is never recomputed. When
+        the boundary moves, only the previous summary and the messages between
+        the old and new boundary are sent to the summarizer, so the cost of a
+        summary call doesn't grow with the session.
+        
+        Sessions that have outgrown max_messages_per_session keep the same
+        recent messages, but everything before them is folded into a copy of
+        the rolling summary with the rolling summarizer (no model call) rather
+        than summarized by the LLM: a full session's oldest messages shift by
+        one every turn, so an LLM summary of them could never be reused and
+        would cost a model call per turn. Either way the summary stands for
+        every message before the recent ones, so a client that sends the
+        whole result leaves nothing out.
+        
+        Args:
+            session_id: Session identifier
+            summarizer: Async callable turning a list of messages into a summary
+            model_id: Identifier of the summarizing model (part of the cache key)
+            max_tokens: Token budget above which older messages are summarized
+            keep_recent: Minimum number of recent messages kept verbatim (at least 1)
+            
+        Returns:
+            Immutable snapshot (tuple) of the messages to send to the LLM
+            
+        Raises:
+            ValueError: If keep_recent is less than 1
+        """
+        if keep_recent < 1:
+            raise ValueError(f"keep_recent must be at least 1, got {keep_recent}")
+        # Reading may block (a Redis round trip, a backend reload), so off the event loop
+        rolling_summary, history = await asyncio.to_thread(self._summary_and_history, session_id)
+        if rolling_summary:
+            boundary = max(((len(history) - keep_recent) // keep_recent) * keep_recent, 0)
+            for msg in history[:boundary]:
+                rolling_summary = self.rolling_summarizer(rolling_summary, msg)
+            return (_rolling_summary_message(rolling_summary),) + history[boundary:]
+        if len(history) <= keep_recent or estimate_tokens(history) <= max_tokens:
+            return history
+        
+        boundary = ((len(history) - keep_recent) // keep_recent) * keep_recent
+        if boundary <= 0:
+            # Fewer than 2 * keep_recent messages: nothing to summarize yet
+            return history
+        prefix, recent = history[:boundary], history[boundary:]
+        
+        owner = _summary_owner(session_id)
+        cached = await self._load_summary(owner)
+        cached_boundary = cached[1] if cached is not None and cached[1] <= boundary else -1
+        
+        # Key of a summary: hash of the model and every message it covers. The
+        # key at the cached boundary shows whether that summary still applies
+        digest = hashlib.sha256(model_id.encode())
+        previous = None
+        for i, msg in enumerate(prefix):
+            if i == cached_boundary and digest.hexdigest() == cached[0]:
+                previous = cached
+            digest.update(orjson.dumps([msg.get("role", ""), msg.get("content", "")]))
+        key = digest.hexdigest()
+        
+        if cached is not None and cached[1] == boundary and cached[0] == key:
+            summary = cached[2]
+        else:
+            if previous is not None:
+                # Fold only the newly covered messages into the previous summary
+                summary = await summarizer(
+                    ({"role": "system", "content": f"Summary of the earlier conversation: {previous[2]}"},)
+                    + prefix[previous[1]:]
+                )
+                summarized = boundary - previous[1]
+            else:
+                summary = await summarizer(prefix)
+                summarized = boundary
+            await self._store_summary(owner, key, boundary, summary)
+            logger.info("Summarized %d earlier messages of session %s", summarized, session_id)
+        
+        return ({"role": "system", "content": f"Summary of the earlier conversation: {summary}"},) + recent
+    
+    async def _load_summary(self, owner: str) -> Optional[Tuple[str, int, str]]:
+        """
+        Look up a session's cached history summary in memory, then on disk.
+        
+        Only the latest summary is kept per session: the boundary only moves
+        forward, and the next summary is built from it.
+        
+        Returns:
+            (key, number of messages covered, summary), or None
+        """
+        with self._summaries_lock:
+            entry = self._summaries.get(owner)
+        if entry is None and self.summary_cache_dir is not None:
+            entry = await asyncio.to_thread(self._read_summary_file, owner)
+            if entry is not None:
+                with self._summaries_lock:
+                    self._summaries.set(owner, entry)
+        return entry
+    
+    async def _store_summary(self, owner: str, key: str, boundary: int, summary: str):
+        """Cache a session's history summary in memory and, if configured, on disk."""
+        with self._summaries_lock:
+            self._summaries.set(owner, (key, boundary, summary))
+        if self.summary_cache_dir is not None:
+            await asyncio.to_thread(self._write_summary_file, owner, key, boundary, summary)
+    
+    def _summary_path(self, owner: str) -> pathlib.Path:
+        return self.summary_cache_dir / f"{owner}.json"
+    
+    def _read_summary_file(self, owner: str) -> Optional[Tuple[str, int, str]]:
+        try:
+            data = orjson.loads(self._summary_path(owner).read_bytes())
+            return data["key"], int(data["boundary"]), data["summary"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Could not read summary cache: %s", e)
+            return None
+    
+    def _write_summary_file(self, owner: str, key: str, boundary: int, summary: str):
+        try:
+            self.summary_cache_dir.mkdir(parents=True, exist_ok=True)
+            self._summary_path(owner).write_bytes(
+                orjson.dumps({"key": key, "boundary": boundary, "summary": summary})
+            )
+        except OSError as e:
+            logger.warning("Could not write summary cache: %s", e)
+    
+    def _drop_summaries(self, session_id: str):
+        """Forget a session's history summary, in memory and on disk."""
+        owner = _summary_owner(session_id)
+        with self._summaries_lock:
+            self._summaries.pop(owner)
+        if self.summary_cache_dir is not None:
+            try:
+                self._summary_path(owner).unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning("Could not delete summary cache: %s", e)
     
     def clear_session(self, session_id: str):
         """
@@ -74,18 +853,95 @@ class ConversationService:
         Args:
             session_id: Session identifier
         """
-        if session_id in self.sessions:
-            self.sessions[session_id] = []
-            logger.info(f"Cleared conversation history for session {session_id}")
+        key = _session_key(session_id)
+        stripe = self._stripe(key)
+        self._drop_summaries(_session_id(key))
+        with self._stripes[stripe]:
+            self.backend.clear(_session_id(key))
+            messages = self.sessions.get(key)
+            if messages is None:
+                return
+            self._release_all(messages, self._stripe_counts[stripe])
+            self._rolling_summaries.pop(key, None)
+            # The session is empty, not unknown: keep its window (and SessionLog)
+            if self._window_n:
+                self._window_cache[key] = ()
+        logger.info("Cleared conversation history for session %s", session_id)
+    
+    def close(self):
+        """Release the backend's resources (call once, on shutdown)."""
+        self.backend.close()
+    
+    def _release_all(self, messages: SessionLog, counts: Dict[str, int]):
+        """Empty a session and uncount its messages."""
+        for role in messages.roles:
+            self._count(counts, role, -1)
+        messages.clear()
+    
+    @staticmethod
+    def _count(counts: Dict[str, int], role: str, delta: int):
+        """Adjust a stripe's running message counters for a message of the given role."""
+        counts["total"] += delta
+        if role in ("user", "assistant"):
+            counts[role] += delta
+    
+    def get_counts(self) -> Dict[str, int]:
+        """
+        Get running message counts (for admin stats).
+        
+        Returns:
+            Dictionary with "user", "assistant" and "total" message counts
+        """
+        totals = {"user": 0, "assistant": 0, "total": 0}
+        for counts in self._stripe_counts:
+            for name, value in counts.items():
+                totals[name] += value
+        return totals
     
-    def get_all_sessions(self) -> Dict[str, List[Dict[str, str]]]:
+    def get_session_count(self) -> int:
+        """
+        Get the number of stored sessions.
+        
+        Returns:
+            Number of sessions
+        """
+        return len(self.sessions)
+    
+    def get_all_sessions(self) -> Dict[str, Collection[Dict[str, str]]]:
         """
         Get all conversation sessions (for admin panel).
         
         Returns:
-            Dictionary of all sessions with their messages
+            Dictionary of all sessions (by string session ID) with an immutable
+            snapshot (tuple) of their messages, safe to iterate while the
+            sessions keep changing (e.g. during a streamed export)
+        """
+        with self._sessions_lock:
+            items = list(self.sessions.items())
+        sessions = {}
+        for key, messages in items:
+            with self._stripes[self._stripe(key)]:
+                sessions[_session_id(key)] = tuple(messages)
+        return sessions
+    
+    def anonymize_session_id(self, session_id: str) -> str:
+        """
+        Get the anonymized form of a session ID.
+        
+        BLAKE2b is stable across processes and restarts (unlike hash()) and
+        faster than SHA-256 on short inputs.
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            16-character hex digest
         """
-        return self.sessions.copy()
+        anonymized = self._anonymized_ids.get(session_id)
+        if anonymized is None:
+            anonymized = hashlib.blake2b(session_id.encode(), digest_size=8).hexdigest()
+            self._anonymized_ids[session_id] = anonymized
+        return anonymized
     
     def get_all_conversations_anonymous(self) -> List[Dict]:
         """
@@ -95,17 +951,36 @@ class ConversationService:
             List of conversations with anonymized session IDs
         """
         conversations = []
-        for session_id, messages in self.sessions.items():
+        for session_id, messages in self.get_all_sessions().items():
             conversations.append({
-                "session_id_hash": str(hash(session_id))[:16],  # Anonymized session ID
+                "session_id_hash": self.anonymize_session_id(session_id),  # Anonymized session ID
                 "message_count": len(messages),
                 "messages": [
                     {
                         "role": msg.get("role", "unknown"),
                         "content": msg.get("content", ""),
-                        "timestamp": msg.get("timestamp", "")
+                        "timestamp": format_timestamp(msg)
                     }
                     for msg in messages
                 ]
             })
         return conversations
+    
+    def iter_anonymous_rows(self) -> Iterator[Tuple[str, int, str, str, str]]:
+        """
+        Iterate over all messages as flat, anonymized export rows.
+        
+        Yields:
+            (session_id_hash, message_number, role, content, timestamp) tuples,
+            ready for csv.writer
+        """
+        for session_id, messages in self.get_all_sessions().items():
+            session_id_hash = self.anonymize_session_id(session_id)
+            for idx, msg in enumerate(messages, 1):
+                yield (
+                    session_id_hash,
+                    idx,
+                    msg.get("role", "unknown"),
+                    msg.get("content", ""),
+                    format_timestamp(msg)
+                )
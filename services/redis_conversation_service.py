@@ -0,0 +1,272 @@
+"""
+Redis/Valkey-backed conversation storage shared across worker processes.
+"""
+
+import uuid
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Collection, Iterable, Dict, Tuple
+import orjson
+
+from services.conversation_service import ConversationService
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_KEY = "sessions"
+STATS_KEYS = {
+    "total": "stats:total_messages",
+    "user": "stats:user_messages",
+    "assistant": "stats:assistant_messages",
+}
+
+
+def _session_key(session_id: str) -> str:
+    return f"session:{session_id}"
+
+
+class RedisConversationService(ConversationService):
+    """
+    Conversation service storing sessions in Redis so every worker sees the same history.
+
+    Layout:
+        session:{id}          list of JSON-encoded messages (RPUSH per message)
+        sessions              set of known session IDs
+        stats:*_messages      running message counters (INCR per message)
+
+    Recently used sessions are mirrored in a small in-process LRU. A cached
+    session is validated with LLEN (O(1)) and only the missing tail is fetched,
+    so active chats avoid re-reading their whole history on every turn.
+
+    Methods are called from threadpool threads. Mirrored histories are
+    immutable tuples that are replaced, never mutated, and the LRU itself is
+    only touched under a lock, which is never held across a Redis call.
+    """
+
+    def __init__(self, redis_client, local_cache_size: int = 256, **kwargs):
+        """
+        Initialize Redis-backed conversation service.
+
+        Args:
+            redis_client: redis.Redis client (decode_responses=False)
+            local_cache_size: Number of sessions mirrored in the in-process LRU
+            **kwargs: Passed through to ConversationService
+        """
+        super().__init__(**kwargs)
+        self.redis = redis_client
+        self.local_cache_size = local_cache_size
+        self._local: "OrderedDict[str, Tuple[Dict[str, str], ...]]" = OrderedDict()
+        self._local_lock = threading.Lock()
+        # Set by from_url: the client (and its connection pool) is closed with the service
+        self._owns_redis = False
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisConversationService":
+        """
+        Create a service connected to the Redis/Valkey server at url.
+
+        Args:
+            url: Redis URL (e.g. redis://localhost:6379/0)
+            **kwargs: Passed through to the constructor
+        """
+        import redis
+
+        client = redis.Redis.from_url(url)
+        client.ping()
+        logger.info("Connected to Redis conversation store")
+        service = cls(client, **kwargs)
+        service._owns_redis = True
+        return service
+
+    def close(self):
+        """Release resources; a client created by from_url is closed with its connection pool."""
+        super().close()
+        if self._owns_redis:
+            self.redis.close()
+
+    def _remember(self, session_id: str, messages: Tuple[Dict[str, str], ...]):
+        """Store a session in the local LRU (caller holds _local_lock)."""
+        self._local[session_id] = messages
+        self._local.move_to_end(session_id)
+        while len(self._local) > self.local_cache_size:
+            self._local.popitem(last=False)
+
+    def _extend_local(self, session_id: str, messages: Tuple[Dict[str, str], ...], new_length: int):
+        """
+        Append just-stored messages to a session's local copy.
+
+        The copy is only extended if it was in sync (new_length is the list
+        length Redis reported after the push); otherwise it is dropped and
+        refetched on the next read.
+        """
+        with self._local_lock:
+            cached = self._local.get(session_id)
+            if cached is not None and len(cached) == new_length - len(messages):
+                self._remember(session_id, cached + messages)
+            else:
+                self._local.pop(session_id, None)
+
+    def create_session(self) -> str:
+        """
+        Create a new conversation session.
+
+        Returns:
+            New session ID (UUID)
+        """
+        session_id = str(uuid.uuid4())
+        self.redis.sadd(SESSIONS_KEY, session_id)
+        with self._local_lock:
+            self._remember(session_id, ())
+        logger.info("Created new conversation session: %s", session_id)
+        return session_id
+
+    def add_message(self, session_id: str, role: str, content: str):
+        """
+        Add a message to a conversation session.
+
+        Args:
+            session_id: Session identifier
+            role: Message role ("user" or "assistant")
+            content: Message content
+        """
+        message = {
+            "role": role,
+            "content": content,
+            "ts": time.time_ns()  # formatted lazily, see format_timestamp
+        }
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(_session_key(session_id), orjson.dumps(message))
+        pipe.sadd(SESSIONS_KEY, session_id)
+        pipe.incr(STATS_KEYS["total"])
+        if role in ("user", "assistant"):
+            pipe.incr(STATS_KEYS[role])
+        new_length = pipe.execute()[0]
+
+        self._extend_local(session_id, (message,), new_length)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Added %s message to session %s", role, session_id)
+
+    def add_messages(self, session_id: str, messages: Iterable[Tuple[str, str]]):
+        """
+        Add several messages to a conversation session in one round trip.
+
+        Args:
+            session_id: Session identifier
+            messages: (role, content) pairs, oldest first
+        """
+        ts = time.time_ns()
+        batch = [{"role": role, "content": content, "ts": ts} for role, content in messages]
+        if not batch:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(_session_key(session_id), *(orjson.dumps(message) for message in batch))
+        pipe.sadd(SESSIONS_KEY, session_id)
+        pipe.incrby(STATS_KEYS["total"], len(batch))
+        for role in ("user", "assistant"):
+            added = sum(1 for message in batch if message["role"] == role)
+            if added:
+                pipe.incrby(STATS_KEYS[role], added)
+        new_length = pipe.execute()[0]
+
+        self._extend_local(session_id, tuple(batch), new_length)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Added %d messages to session %s", len(batch), session_id)
+
+    def get_session_history(self, session_id: str) -> Tuple[Dict[str, str], ...]:
+        """
+        Get conversation history for a session.
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            Immutable snapshot (tuple) of the messages in the conversation
+        """
+        key = _session_key(session_id)
+        length = self.redis.llen(key)
+        with self._local_lock:
+            cached = self._local.get(session_id)
+
+        if cached is None or len(cached) > length:
+            cached = tuple(orjson.loads(raw) for raw in self.redis.lrange(key, 0, -1))
+        elif len(cached) < length:
+            # Another worker appended messages; fetch only the new tail
+            cached += tuple(orjson.loads(raw) for raw in self.redis.lrange(key, len(cached), -1))
+
+        with self._local_lock:
+            # Don't replace a longer copy a concurrent add_message just stored
+            current = self._local.get(session_id)
+            if current is None or len(current) <= len(cached):
+                self._remember(session_id, cached)
+        return cached
+
+    def _summary_and_history(self, session_id: str) -> Tuple[str, Tuple[Dict[str, str], ...]]:
+        """Redis sessions keep no rolling summary: ("", full history)."""
+        return "", self.get_session_history(session_id)
+
+    def clear_session(self, session_id: str):
+        """
+        Clear conversation history for a session.
+
+        Args:
+            session_id: Session identifier
+        """
+        key = _session_key(session_id)
+        self._drop_summaries(session_id)
+        messages = [orjson.loads(raw) for raw in self.redis.lrange(key, 0, -1)]
+        if not messages:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.decrby(STATS_KEYS["total"], len(messages))
+        for role in ("user", "assistant"):
+            removed = sum(1 for msg in messages if msg.get("role") == role)
+            if removed:
+                pipe.decrby(STATS_KEYS[role], removed)
+        pipe.execute()
+
+        # Keep the session mirrored: empty is in sync with the deleted key
+        with self._local_lock:
+            if session_id in self._local:
+                self._local[session_id] = ()
+        logger.info("Cleared conversation history for session %s", session_id)
+
+    def get_counts(self) -> Dict[str, int]:
+        """
+        Get running message counts (for admin stats).
+
+        Returns:
+            Dictionary with "user", "assistant" and "total" message counts
+        """
+        names = list(STATS_KEYS)
+        values = self.redis.mget([STATS_KEYS[name] for name in names])
+        return {name: int(value or 0) for name, value in zip(names, values)}
+
+    def get_session_count(self) -> int:
+        """
+        Get the number of stored sessions.
+
+        Returns:
+            Number of sessions
+        """
+        return self.redis.scard(SESSIONS_KEY)
+
+    def get_all_sessions(self) -> Dict[str, Collection[Dict[str, str]]]:
+        """
+        Get all conversation sessions (for admin panel).
+
+        Returns:
+            Dictionary of all sessions with their messages
+        """
+        session_ids = sorted(raw.decode() for raw in self.redis.smembers(SESSIONS_KEY))
+        pipe = self.redis.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.lrange(_session_key(session_id), 0, -1)
+        return {
+            session_id: [orjson.loads(raw) for raw in messages]
+            for session_id, messages in zip(session_ids, pipe.execute())
+        }
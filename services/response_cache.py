@@ -0,0 +1,239 @@
+"""
+Response cache placed in front of the LLM client.
+Exact-match tier keyed on the message and recent history, with an optional
+semantic tier that matches paraphrased messages by embedding similarity.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Sequence[float]]
+
+# Semantic candidates scored inline; larger scans run in a worker thread
+INLINE_SCAN_MAX = 32
+
+
+def load_sentence_transformer_embedder(model_name: str) -> Optional[Embedder]:
+    """
+    Build an embedder backed by sentence-transformers, if it is installed.
+
+    Args:
+        model_name: sentence-transformers model to load (e.g. all-MiniLM-L6-v2)
+
+    Returns:
+        Callable mapping text to an embedding vector, or None if unavailable
+    """
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning("sentence-transformers is not installed; semantic response cache disabled")
+        return None
+
+    model = SentenceTransformer(model_name)
+    logger.info("Loaded embedding model for semantic response cache: %s", model_name)
+    return lambda text: model.encode(text).tolist()
+
+
+def _normalize(text: str) -> str:
+    """Collapse whitespace and case so trivially different messages share a key."""
+    return " ".join(text.lower().split())
+
+
+def _unit(vector: Sequence[float]) -> List[float]:
+    """Scale a vector to unit length so a dot product is the cosine similarity."""
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _best_match(
+    vector: List[float],
+    candidates: Sequence[Tuple[str, List[float]]],
+    threshold: float
+) -> Tuple[Optional[str], float]:
+    """Key and score of the most similar candidate at or above threshold (None if none)."""
+    best_key, best_score = None, threshold
+    for candidate_key, candidate_vector in candidates:
+        score = sum(a * b for a, b in zip(vector, candidate_vector))
+        if score >= best_score:
+            best_key, best_score = candidate_key, score
+    return best_key, best_score
+
+
+class ResponseCache:
+    """Two-tier (exact + semantic) LRU cache of LLM responses."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        history_window: int = 10,
+        embedder: Optional[Embedder] = None,
+        similarity_threshold: float = 0.92,
+        ttl_seconds: Optional[float] = None,
+        max_semantic_entries: int = 256
+    ):
+        """
+        Initialize response cache.
+
+        Args:
+            max_entries: Maximum number of cached responses (LRU eviction)
+            history_window: Number of trailing history messages that form the context key
+            embedder: Optional callable returning an embedding for a message;
+                enables the semantic tier when set
+            similarity_threshold: Minimum cosine similarity for a semantic hit
+            ttl_seconds: Seconds a cached response stays valid (no expiry when None)
+            max_semantic_entries: Maximum number of embeddings kept for the
+                semantic tier (oldest dropped first; their responses stay
+                reachable by exact match)
+        """
+        self.max_entries = max_entries
+        self.history_window = history_window
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_semantic_entries = max_semantic_entries
+
+        # key -> (response, expiry on the monotonic clock), ordered by recency
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        # Semantic tier: key -> context key, oldest first, and per context key
+        # {key: unit embedding}, so a lookup only scores its own context
+        self._vectors: "OrderedDict[str, str]" = OrderedDict()
+        self._vectors_by_context: Dict[str, Dict[str, List[float]]] = {}
+        self._last_embedding: Optional[Tuple[str, List[float]]] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def _context_key(self, conversation_history: Optional[Sequence[Dict[str, str]]]) -> str:
+        """Hash the trailing history messages the LLM would see."""
+        digest = hashlib.blake2b(digest_size=16)
+        for msg in list(conversation_history or [])[-self.history_window:]:
+            digest.update(msg.get("role", "").encode())
+            digest.update(b"\x00")
+            digest.update(msg.get("content", "").encode())
+            digest.update(b"\x01")
+        return digest.hexdigest()
+
+    @staticmethod
+    def _key(normalized_message: str, context_key: str) -> str:
+        return hashlib.blake2b(f"{context_key}\x00{normalized_message}".encode(), digest_size=16).hexdigest()
+
+    async def _embed(self, normalized_message: str) -> List[float]:
+        """Embed a message off the event loop, reusing the last result for get() -> put()."""
+        if self._last_embedding and self._last_embedding[0] == normalized_message:
+            return self._last_embedding[1]
+        vector = _unit(await asyncio.to_thread(self.embedder, normalized_message))
+        self._last_embedding = (normalized_message, vector)
+        return vector
+
+    def _drop_vector(self, key: str):
+        """Remove an entry's embedding from the semantic tier, if it has one."""
+        context_key = self._vectors.pop(key, None)
+        if context_key is not None:
+            vectors = self._vectors_by_context[context_key]
+            del vectors[key]
+            if not vectors:
+                del self._vectors_by_context[context_key]
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Return a live entry and mark it recently used; drop it if it has expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        response, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._drop_vector(key)
+            return None
+        self._entries.move_to_end(key)
+        return response
+
+    async def get(
+        self,
+        message: str,
+        conversation_history: Optional[Sequence[Dict[str, str]]] = None
+    ) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            message: User's message
+            conversation_history: Conversation history the response would be generated from
+
+        Returns:
+            Cached response, or None on a miss
+        """
+        if self.max_entries <= 0:
+            return None
+
+        normalized = _normalize(message)
+        context_key = self._context_key(conversation_history)
+        key = self._key(normalized, context_key)
+
+        response = self._lookup(key)
+        if response is not None:
+            self.hits += 1
+            logger.debug("Response cache exact hit")
+            return response
+
+        candidates = self._vectors_by_context.get(context_key) if self.embedder is not None else None
+        if candidates:
+            vector = await self._embed(normalized)
+            # Snapshot, so a scan in a worker thread isn't affected by concurrent puts
+            candidates = list(candidates.items())
+            if len(candidates) <= INLINE_SCAN_MAX:
+                best_key, best_score = _best_match(vector, candidates, self.similarity_threshold)
+            else:
+                best_key, best_score = await asyncio.to_thread(
+                    _best_match, vector, candidates, self.similarity_threshold
+                )
+            response = self._lookup(best_key) if best_key is not None else None
+            if response is not None:
+                self.hits += 1
+                logger.debug("Response cache semantic hit (similarity %.3f)", best_score)
+                return response
+
+        self.misses += 1
+        return None
+
+    async def put(
+        self,
+        message: str,
+        conversation_history: Optional[Sequence[Dict[str, str]]],
+        response: str
+    ):
+        """
+        Store a response.
+
+        Args:
+            message: User's message
+            conversation_history: Conversation history the response was generated from
+            response: LLM response to cache
+        """
+        if self.max_entries <= 0:
+            return
+
+        normalized = _normalize(message)
+        context_key = self._context_key(conversation_history)
+        key = self._key(normalized, context_key)
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else math.inf
+        self._entries[key] = (response, expires_at)
+        self._entries.move_to_end(key)
+        if self.embedder is not None and self.max_semantic_entries > 0:
+            vector = await self._embed(normalized)
+            self._drop_vector(key)
+            self._vectors[key] = context_key
+            self._vectors_by_context.setdefault(context_key, {})[key] = vector
+            while len(self._vectors) > self.max_semantic_entries:
+                self._drop_vector(next(iter(self._vectors)))
+
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._drop_vector(evicted_key)
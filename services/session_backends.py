@@ -0,0 +1,146 @@
+"""
+Persistent stores behind ConversationService's in-process session tier.
+"""
+
+import logging
+import pathlib
+import sqlite3
+import threading
+from typing import Iterable, List, Protocol, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (role, content, ts) as stored; ts is time.time_ns()
+StoredMessage = Tuple[str, str, int]
+
+
+class Backend(Protocol):
+    """
+    Where sessions live once they are evicted from memory.
+
+    ConversationService writes every message through to its backend and
+    loads a session back when it isn't in memory, so the in-process tier only
+    has to hold the sessions in use.
+    """
+
+    def load(self, session_id: str) -> List[StoredMessage]:
+        """All stored messages of a session, oldest first ([] if unknown)."""
+        ...
+
+    def append(self, session_id: str, role: str, content: str, ts: int):
+        """Store one message at the end of a session."""
+        ...
+
+    def extend(self, session_id: str, messages: Iterable[StoredMessage]):
+        """Store several messages at the end of a session, in order."""
+        ...
+
+    def clear(self, session_id: str):
+        """Delete a session's messages."""
+        ...
+
+    def close(self):
+        """Release resources."""
+        ...
+
+
+class InMemoryBackend:
+    """
+    No persistent store: sessions exist only while they are held in memory.
+
+    The default, and the behavior of the service before backends existed; an
+    evicted session (or any session after a restart) starts over empty.
+    """
+
+    def load(self, session_id: str) -> List[StoredMessage]:
+        return []
+
+    def append(self, session_id: str, role: str, content: str, ts: int):
+        pass
+
+    def extend(self, session_id: str, messages: Iterable[StoredMessage]):
+        pass
+
+    def clear(self, session_id: str):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """
+    Sessions stored in a SQLite database file, one row per message.
+
+    The table is keyed by (session_id, seq), so loading a session is a single
+    range scan of the primary key. The database runs in WAL mode with
+    synchronous=NORMAL: appends don't block readers, and several worker
+    processes can share one file on the same host.
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        """
+        Open (and if needed create) the database.
+
+        Args:
+            path: Database file path
+            timeout: Seconds to wait for another process's write lock
+        """
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by all threads, serialized by a lock; autocommit
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " session_id TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " role TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " ts INTEGER NOT NULL,"
+                " PRIMARY KEY (session_id, seq)"
+                ") WITHOUT ROWID"
+            )
+        logger.info("Opened SQLite conversation store at %s", path)
+
+    def load(self, session_id: str) -> List[StoredMessage]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT role, content, ts FROM messages WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+
+    def append(self, session_id: str, role: str, content: str, ts: int):
+        # Next seq is computed in the same statement, so concurrent writers can't collide
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO messages (session_id, seq, role, content, ts)"
+                " SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ? FROM messages WHERE session_id = ?",
+                (session_id, role, content, ts, session_id)
+            )
+
+    def extend(self, session_id: str, messages: Iterable[StoredMessage]):
+        rows = [(session_id, role, content, ts, session_id) for role, content, ts in messages]
+        # One transaction (a single fsync in WAL mode) for the whole batch
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO messages (session_id, seq, role, content, ts)"
+                    " SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ?, ? FROM messages WHERE session_id = ?",
+                    rows
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()